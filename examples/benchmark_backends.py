@@ -0,0 +1,56 @@
+# examples/benchmark_backends.py
+"""Compare cold-start subprocess execution with the pooled and fork-server
+backends. Run with: python examples/benchmark_backends.py [runs]"""
+from enact import EnactClient
+from enact.models import EnactTask
+import asyncio
+import sys
+import time
+
+BENCH_TASK = {
+    "enact": "1.0.0",
+    "id": "Bench",
+    "name": "Benchmark",
+    "description": "Imports a few stdlib modules and echoes its input",
+    "version": "1.0.0",
+    "authors": [{"name": "Test User"}],
+    "inputs": {"n": {"type": "number", "description": "A number"}},
+    "tasks": [
+        {
+            "id": "echo",
+            "type": "script",
+            "language": "python",
+            "code": """
+import decimal, email.parser, http.client, xml.dom.minidom
+print(json.dumps({"n": inputs["n"]}))
+""",
+        }
+    ],
+    "flow": {"steps": [{"task": "echo"}]},
+    "outputs": {"n": {"type": "number", "description": "The same number"}},
+}
+
+
+class MockClient(EnactClient):
+    async def get_task(self, task_id: str, **kwargs):
+        return EnactTask.model_validate(BENCH_TASK)
+
+
+async def bench(backend: str, runs: int) -> float:
+    async with MockClient("http://dummy-url", backend=backend) as client:
+        # Warm up: builds the venv and starts any long-lived processes
+        await client.execute_task("Bench", {"n": 0})
+        started = time.perf_counter()
+        for n in range(runs):
+            await client.execute_task("Bench", {"n": n})
+        return (time.perf_counter() - started) / runs
+
+
+async def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for backend in ["subprocess", "pool", "forkserver", "inprocess"]:
+        per_run = await bench(backend, runs)
+        print(f"{backend:>10}: {per_run * 1000:7.2f} ms per execution")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,10 @@
+import logging
+
+from .cache import ResultCache, TaskCache
 from .client import EnactClient
 
 __version__ = "0.1.0"
-__all__ = ["EnactClient"]
+__all__ = ["EnactClient", "ResultCache", "TaskCache"]
+
+# Library logging stays silent unless the application configures a handler
+logging.getLogger(__name__).addHandler(logging.NullHandler())
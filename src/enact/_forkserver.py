@@ -0,0 +1,162 @@
+"""Fork server (zygote), run with a venv's interpreter by enact.forkserver
+
+Usage: python _forkserver.py SOCKET_PATH PRELOAD_JSON
+
+PRELOAD_JSON is a list of distribution or module names. The zygote imports
+the top-level modules they provide once, then listens on
+a Unix socket. Every connection is handled by a freshly forked child, which
+starts a new session, sends its pid, reads one length-prefixed JSON
+request, applies its resource limits to itself, runs the task with the same
+contract as _worker.py, writes the response and exits. Each run is
+therefore isolated while the import cost is paid only once per venv. The
+zygote reaps its children and, if one dies without exiting cleanly (killed
+by SIGXCPU or its timeout alarm, say), sends ``{"ok": false, "exit": code}``
+with the negated signal number on that child's connection.
+"""
+import importlib
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import threading
+
+import _worker  # also drops this directory from sys.path
+
+
+def _canonical(name):
+    return name.lower().replace('-', '_').replace('.', '_')
+
+
+def module_names(names):
+    """Map distribution names (e.g. scikit-learn) to importable modules"""
+    try:
+        from importlib.metadata import packages_distributions
+        provided = packages_distributions()
+    except ImportError:  # Python < 3.10
+        provided = {}
+
+    wanted = {_canonical(name) for name in names}
+    modules = [
+        module for module, distributions in provided.items()
+        if not module.startswith('_')
+        and any(_canonical(d) in wanted for d in distributions)
+    ]
+    found = {_canonical(d) for ds in provided.values() for d in ds}
+    modules.extend(
+        _canonical(name) for name in names if _canonical(name) not in found)
+    return modules
+
+
+def preload(names):
+    for name in module_names(names):
+        try:
+            importlib.import_module(name)
+        except Exception:
+            # Preloading is best effort; the task will report real failures
+            pass
+
+
+def exit_code(status):
+    # Like Popen.returncode: negative for a child killed by a signal
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def reap_children(connections):
+    """Reap exited children, reporting abnormal exits on their connection"""
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if not pid:
+            return
+        conn = connections.pop(pid, None)
+        if conn is None:
+            continue
+        with conn:
+            code = exit_code(status)
+            if code:
+                message = json.dumps({'ok': False, 'exit': code}).encode()
+                try:
+                    conn.sendall(_worker.HEADER.pack(len(message)) + message)
+                except OSError:
+                    # The caller has gone away already
+                    pass
+
+
+def exit_with_parent(stdin):
+    # The parent holds our stdin open; EOF means it has gone away
+    stdin.read()
+    os._exit(0)
+
+
+def handle(conn):
+    with conn, conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+        # Lead a process group of our own so the parent can kill this run
+        # along with anything it spawns
+        os.setsid()
+        _worker.write_message(writer, {'pid': os.getpid()})
+        request = _worker.read_message(reader)
+        if request is not None:
+            limits = request.get('limits') or {}
+            _worker.apply_limits(limits)
+            response = _worker.run_task(
+                request['code'], request['inputs'],
+                request.get('artifacts_dir'), request.get('code_path'),
+                limits.get('max_output_bytes'))
+            _worker.write_message(writer, response)
+
+
+def main():
+    socket_path, preload_json = sys.argv[1:3]
+    preload(json.loads(preload_json))
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    # Tell the parent we are ready, then keep stray output off the pipe
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+    os.dup2(2, 1)
+    threading.Thread(
+        target=exit_with_parent, args=(sys.stdin.buffer,), daemon=True).start()
+    sys.stdin = open(os.devnull)
+
+    # SIGCHLD only wakes the loop up, so children are reaped, and their
+    # connections looked up, in one place
+    wakeup, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    # Child pid -> its connection, kept to report how the child exited
+    connections = {}
+    while True:
+        ready, _, _ = select.select([listener, wakeup], [], [])
+        if wakeup in ready:
+            os.read(wakeup, 4096)
+            reap_children(connections)
+        if listener not in ready:
+            continue
+        conn, _ = listener.accept()
+        pid = os.fork()
+        if pid == 0:
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            for fd in (wakeup, wakeup_write):
+                os.close(fd)
+            for other in [listener, *connections.values()]:
+                other.close()
+            try:
+                handle(conn)
+            finally:
+                os._exit(0)
+        connections[pid] = conn
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Static task runner, run with a venv's interpreter by SubprocessBackend
+
+Usage: python _runner.py ENCODING [--result PATH] [--result-encoding ENC]
+                                   [--artifacts DIR] [--code PATH]
+                                   [--timings] [--profile PATH] [--stream]
+                                   [--rlimits JSON]
+
+The task code and its inputs arrive on stdin rather than being spliced into
+generated source: an 8-byte big-endian length, the UTF-8 task code, then the
+inputs encoded as compact JSON or pickle (for binary or numeric data) until
+EOF. The task then runs exactly as a generated script would, printing its
+JSON result to stdout. Tasks may instead call ``set_result(value)``, which
+writes the value to the --result file (as JSON or marshal data) and leaves
+stdout to logging, and ``save_artifact()`` to write files into --artifacts;
+see _worker.py. With --stream, stdout is line buffered so that each record
+a task prints (or passes to ``emit()``) reaches the caller as it is written.
+With --code, the task code is loaded already compiled from PATH, written by
+enact's CodeCache, whenever that was compiled by the same Python version.
+
+With --timings, a line starting with TIMINGS_MARKER is appended to stderr
+after a successful run, holding the wall-clock time the runner started and
+the seconds the task code took. With --profile, the task runs under
+cProfile and the stats are written to PATH, even if the task fails.
+With --rlimits, the runner first applies the given CPU and memory limits
+(``{"cpu_seconds": ..., "memory_bytes": ...}``) to itself, as forked
+children do, so its parent can spawn it without a preexec_fn.
+"""
+import time
+
+_STARTED = time.time()
+
+# Imported after taking _STARTED so --timings counts them as startup
+import json  # noqa: E402
+import os  # noqa: E402
+import pickle  # noqa: E402
+import struct  # noqa: E402
+import sys  # noqa: E402
+
+# Also drops this directory from sys.path
+import _worker  # noqa: E402
+
+HEADER = struct.Struct('>Q')
+TIMINGS_MARKER = '\0enact-timings:'
+
+
+def main():
+    encoding = sys.argv[1]
+    options = sys.argv[2:]
+
+    def option(name):
+        if name in options:
+            return options[options.index(name) + 1]
+        return None
+
+    if option('--rlimits'):
+        _worker.apply_limits(json.loads(option('--rlimits')))
+
+    stream = sys.stdin.buffer
+    (size,) = HEADER.unpack(stream.read(HEADER.size))
+    code = stream.read(size).decode()
+    payload = stream.read()
+    sys.stdin = open(os.devnull)
+
+    if encoding == 'pickle':
+        inputs = pickle.loads(payload)
+    else:
+        inputs = json.loads(payload)
+    del payload
+
+    context = _worker.TaskContext(option('--artifacts'))
+    namespace = context.namespace(inputs)
+    if '--stream' in options:
+        sys.stdout.reconfigure(line_buffering=True)
+    compiled = _worker.load_code(code, option('--code'))
+    running = time.perf_counter()
+    if '--profile' in options:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.runctx(compiled, namespace, namespace)
+        finally:
+            profiler.dump_stats(option('--profile'))
+    else:
+        exec(compiled, namespace)
+
+    if context.result is not _worker.NO_RESULT:
+        write_result(context.result, option('--result'),
+                     option('--result-encoding') or 'json')
+    if '--timings' in options:
+        sys.stdout.flush()
+        timings = {'started': _STARTED, 'run': time.perf_counter() - running}
+        sys.stderr.write(f"\n{TIMINGS_MARKER}{json.dumps(timings)}\n")
+
+
+def write_result(result, path, encoding):
+    if path is None:
+        # An older caller without a result channel expects JSON on stdout
+        print(json.dumps(result))
+        return
+    if encoding == 'marshal':
+        import marshal
+        data = marshal.dumps(result)
+    else:
+        data = json.dumps(result, separators=(',', ':')).encode()
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Long-lived task worker, run with a venv's interpreter by enact.worker_pool
+
+This file is executed directly by the venv Python, so it must only use the
+standard library. Requests and responses are length-prefixed JSON messages:
+requests arrive on stdin and responses go to the original stdout. Anything
+else written to fd 1 is redirected to stderr so it cannot corrupt the
+protocol, while ``print`` output of a task is captured and returned.
+
+Tasks may call ``set_result(value)`` to return their result separately
+from anything they print, and ``save_artifact(name, data)`` to write
+large or binary outputs to a file and get back a small handle to include
+in the result instead.
+
+A worker compiles each distinct task code once, or loads it already
+compiled from the ``code_path`` a request names (see enact.codecache).
+A request's ``max_output_bytes`` caps what the task may print; the task is
+stopped as soon as it writes more and the response has ``"limit":
+"output"``.
+"""
+import io
+import json
+import marshal
+import os
+import struct
+import sys
+import traceback
+
+# Don't let the enact package directory shadow modules imported by tasks
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if sys.path and os.path.abspath(sys.path[0]) == _HERE:
+    del sys.path[0]
+
+HEADER = struct.Struct('>Q')
+ARTIFACT_KEY = '$artifact'
+NO_RESULT = object()
+# Code objects this worker has already loaded, by task code
+_compiled = {}
+_MAX_COMPILED = 64
+
+
+class OutputLimitReached(BaseException):
+    """Raised into a task that prints past its output limit
+
+    A BaseException, so the task's own ``except Exception`` can't swallow it.
+    """
+
+
+class CappedOutput(io.StringIO):
+    """Captured task output, failing once it exceeds ``limit`` bytes"""
+
+    def __init__(self, limit=None):
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+
+    def write(self, text):
+        if self.limit is not None:
+            # Bytes as a child would write them to a pipe
+            self.size += len(text.encode())
+            if self.size > self.limit:
+                raise OutputLimitReached(
+                    f"Task output exceeded {self.limit} bytes")
+        return super().write(text)
+
+
+class TaskContext:
+    """The helpers a task finds in its namespace"""
+
+    def __init__(self, artifacts_dir=None):
+        self.artifacts_dir = artifacts_dir
+        self.result = NO_RESULT
+
+    def set_result(self, value):
+        self.result = value
+
+    def emit(self, record):
+        """Write one NDJSON record, e.g. for execute_task_stream()"""
+        sys.stdout.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def save_artifact(self, name, data, content_type=None):
+        if not self.artifacts_dir:
+            raise RuntimeError("Artifacts are not available in this run")
+        os.makedirs(self.artifacts_dir, exist_ok=True)
+        base = os.path.basename(str(name)) or 'artifact'
+        path = os.path.join(self.artifacts_dir, base)
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(self.artifacts_dir, f'{counter}-{base}')
+            counter += 1
+        if isinstance(data, str):
+            data = data.encode()
+        with open(path, 'wb') as f:
+            f.write(data)
+        return {ARTIFACT_KEY: {
+            'name': base, 'path': path, 'size': len(data),
+            'content_type': content_type,
+        }}
+
+    def namespace(self, inputs):
+        return {
+            '__name__': '__main__',
+            'json': json,
+            'inputs': inputs,
+            'set_result': self.set_result,
+            'emit': self.emit,
+            'save_artifact': self.save_artifact,
+        }
+
+
+def read_message(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (size,) = HEADER.unpack(header)
+    return json.loads(stream.read(size))
+
+
+def write_message(stream, message):
+    try:
+        payload = json.dumps(message).encode()
+    except (TypeError, ValueError) as e:
+        payload = json.dumps({
+            'ok': False, 'error': f"Task result is not JSON serializable: {e}",
+        }).encode()
+    stream.write(HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def apply_limits(limits):
+    """Apply a request's resource limits to this (freshly forked) process"""
+    # Mirrors enact.limits.set_rlimits, which this script can't import from
+    # the task's venv; keep the two in step
+    import math
+    import resource
+    import signal
+
+    def set_limit(which, soft, hard):
+        _, current = resource.getrlimit(which)
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        resource.setrlimit(which, (soft, hard))
+
+    if limits.get('cpu_seconds') is not None:
+        cpu = limits['cpu_seconds']
+        set_limit(resource.RLIMIT_CPU, cpu, cpu + 1)
+    if limits.get('memory_bytes') is not None:
+        memory = limits['memory_bytes']
+        set_limit(resource.RLIMIT_AS, memory, memory)
+    if limits.get('timeout') is not None:
+        # SIGALRM's default action ends the process
+        signal.alarm(max(1, math.ceil(limits['timeout'])))
+
+
+def load_code(code, code_path=None):
+    """Compiled task code, loaded from enact's code cache when possible
+
+    ``code_path`` is where the caller stored the code compiled by its own
+    interpreter; it is only used if it was written by this Python version.
+    """
+    compiled = _compiled.get(code)
+    if compiled is None:
+        if code_path:
+            compiled = read_compiled(code_path)
+        if compiled is None:
+            compiled = compile(code, '<task>', 'exec')
+        if len(_compiled) >= _MAX_COMPILED:
+            _compiled.clear()
+        _compiled[code] = compiled
+    return compiled
+
+
+def read_compiled(path):
+    from importlib.util import MAGIC_NUMBER
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:len(MAGIC_NUMBER)] != MAGIC_NUMBER:
+        return None
+    try:
+        return marshal.loads(data[len(MAGIC_NUMBER):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def run_task(code, inputs, artifacts_dir=None, code_path=None,
+             max_output_bytes=None):
+    stdout = CappedOutput(max_output_bytes)
+    context = TaskContext(artifacts_dir)
+    namespace = context.namespace(inputs)
+    sys.stdout = stdout
+    try:
+        exec(load_code(code, code_path), namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            return {'ok': False, 'error': str(e.code)}
+    except OutputLimitReached as e:
+        return {'ok': False, 'error': str(e), 'limit': 'output'}
+    except Exception:
+        return {'ok': False, 'error': traceback.format_exc()}
+    finally:
+        sys.stdout = sys.__stdout__
+    response = {'ok': True, 'stdout': stdout.getvalue()}
+    if context.result is not NO_RESULT:
+        response['result'] = context.result
+    return response
+
+
+def main():
+    protocol_out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    requests = sys.stdin.buffer
+    sys.stdin = open(os.devnull)
+
+    while True:
+        request = read_message(requests)
+        if request is None:
+            break
+        write_message(protocol_out, run_task(
+            request['code'], request['inputs'], request.get('artifacts_dir'),
+            request.get('code_path'), request.get('max_output_bytes')))
+
+
+if __name__ == '__main__':
+    main()
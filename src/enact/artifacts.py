@@ -0,0 +1,173 @@
+# src/enact/artifacts.py
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+import shutil
+import sys
+import sysconfig
+import tarfile
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIX = '.tar.gz'
+# Describes the archived venv; removed again when it is unpacked
+ARTIFACT_METADATA = '.enact-artifact.json'
+
+
+def platform_tag() -> str:
+    """Identifies the interpreters whose venvs are interchangeable
+
+    Venvs point at their base interpreter, so only nodes with the same
+    Python build installed at the same location can share them.
+    """
+    base = hashlib.sha256(sys.base_prefix.encode()).hexdigest()[:8]
+    platform = sysconfig.get_platform().replace('-', '_').replace('.', '_')
+    return f"{sys.implementation.cache_tag}-{platform}-{base}"
+
+
+def pack_venv(
+    venv_path: Path, archive_path: Path, exclude: Optional[str] = None
+) -> None:
+    """Write a venv to a compressed archive along with its original location"""
+    metadata = {
+        'env_hash': venv_path.name,
+        'path': str(venv_path),
+        'platform': platform_tag(),
+    }
+    archive_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=archive_path.parent, suffix=ARTIFACT_SUFFIX)
+    os.close(fd)
+    try:
+        with tarfile.open(tmp_name, 'w:gz', compresslevel=6) as tar:
+            for child in sorted(venv_path.iterdir()):
+                if child.name != exclude:
+                    tar.add(child, arcname=child.name)
+            data = json.dumps(metadata).encode()
+            info = tarfile.TarInfo(ARTIFACT_METADATA)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        os.replace(tmp_name, archive_path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def read_metadata(archive_path: Path) -> Dict[str, str]:
+    with tarfile.open(archive_path, 'r:gz') as tar:
+        member = tar.extractfile(ARTIFACT_METADATA)
+        if member is None:
+            raise ValueError(f"{archive_path} is not a venv artifact")
+        return json.load(member)
+
+
+def unpack_venv(archive_path: Path, dest: Path) -> Dict[str, str]:
+    """Extract an archive made by pack_venv() and return its metadata"""
+    with tarfile.open(archive_path, 'r:gz') as tar:
+        check_members(tar.getmembers(), dest)
+        if hasattr(tarfile, 'tar_filter'):
+            # Venvs symlink to their base interpreter, which the stricter
+            # 'data' filter would reject
+            tar.extractall(dest, filter='tar')
+        else:
+            tar.extractall(dest)
+    metadata_path = dest / ARTIFACT_METADATA
+    with open(metadata_path) as f:
+        metadata = json.load(f)
+    metadata_path.unlink()
+    if metadata.get('platform') != platform_tag():
+        raise ValueError(
+            f"Venv artifact was built for {metadata.get('platform')}, "
+            f"not {platform_tag()}")
+    return metadata
+
+
+def check_members(members, dest: Path) -> None:
+    """Refuse archive members that would write or link outside ``dest``
+
+    Archives may come from a shared store, so nothing is trusted: members
+    must be regular files, directories or links with relative names free of
+    ``..``, and must not be written, or hard linked, through a symlink.
+    Symlinks may point inside ``dest`` or into the base interpreter, which
+    platform_tag() guarantees is installed here.
+    """
+    root = os.path.abspath(dest)
+    link_roots = (root, os.path.abspath(sys.base_prefix))
+    symlinks = set()
+
+    def check_name(name: str) -> str:
+        parts = [part for part in name.split('/') if part not in ('', '.')]
+        if posixpath.isabs(name) or not parts or '..' in parts or any(
+                '/'.join(parts[:i]) in symlinks for i in range(1, len(parts))):
+            raise ValueError(f"Unsafe path in venv artifact: {name}")
+        return '/'.join(parts)
+
+    for member in members:
+        name = check_name(member.name)
+        if member.issym():
+            target = os.path.normpath(os.path.join(
+                root, posixpath.dirname(name), member.linkname))
+            if not any(_within(target, top) for top in link_roots):
+                raise ValueError(
+                    f"Unsafe link in venv artifact: {member.name} -> "
+                    f"{member.linkname}")
+            symlinks.add(name)
+        elif member.islnk():
+            check_name(member.linkname)
+        elif not (member.isfile() or member.isdir()):
+            raise ValueError(
+                f"Unsupported file type in venv artifact: {member.name}")
+
+
+def _within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class ArtifactStore:
+    """Shared storage that prebuilt venv archives are fetched from
+
+    Subclass this to back venvs with object storage; names are plain file
+    names such as ``<env_hash>-<platform>.tar.gz``.
+    """
+
+    def fetch(self, name: str, dest: Path) -> bool:
+        """Copy an artifact to dest; returns False if it isn't stored"""
+        raise NotImplementedError
+
+    def publish(self, name: str, source: Path) -> None:
+        """Store the archive at source under name"""
+        raise NotImplementedError
+
+
+class DirectoryArtifactStore(ArtifactStore):
+    """Artifacts kept in a local directory or shared filesystem mount"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def fetch(self, name: str, dest: Path) -> bool:
+        try:
+            shutil.copyfile(self.root / name, dest)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def publish(self, name: str, source: Path) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Copy next to the target, then rename, so readers on other nodes
+        # never see a partial archive
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copyfile(source, tmp_name)
+            os.replace(tmp_name, self.root / name)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        logger.debug("Published artifact %s to %s", name, self.root)
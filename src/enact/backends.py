@@ -0,0 +1,414 @@
+# src/enact/backends.py
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set
+
+from .dependency_manager import DependencyManager
+from .forkserver import ForkServer
+from .inprocess import InProcessRunner
+from .limits import child_rlimits
+from .metrics import is_recording, measure, record
+from .models import ResourceLimits
+from .outputs import (
+    DEFAULT_ARTIFACTS_DIR, RESULT_ENCODINGS, TaskOutput, decode_result,
+)
+from .profiling import TaskProfile
+from .singleflight import SingleFlight
+from .worker_pool import HEADER, WorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+RUNNER_SCRIPT = Path(__file__).parent / '_runner.py'
+INPUT_ENCODINGS = ("json", "pickle")
+# Must match _runner.py
+TIMINGS_MARKER = '\0enact-timings:'
+# Results are handed over through a file; keep it in memory where possible
+RESULT_DIR = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+
+
+def build_script(code: str, inputs: Dict[str, Any]) -> str:
+    """Build a standalone script that runs task code with the given inputs"""
+    # Embedding the inputs as one string constant keeps large inputs cheap
+    # for the child to compile, unlike an equivalent dict literal
+    return f"""import json
+
+# Input values
+inputs = json.loads({json.dumps(inputs)!r})
+
+# Main task code
+{code}"""
+
+
+def encode_request(code: str, inputs: Dict[str, Any], encoding: str) -> bytes:
+    """Frame task code and inputs the way _runner.py reads them from stdin"""
+    if encoding == "pickle":
+        payload = pickle.dumps(inputs, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        payload = json.dumps(inputs, separators=(",", ":")).encode()
+    code_bytes = code.encode()
+    return HEADER.pack(len(code_bytes)) + code_bytes + payload
+
+
+async def run_in_runner(
+    dependency_manager: DependencyManager,
+    venv_path: Path,
+    code: str,
+    inputs: Dict[str, Any],
+    input_encoding: str = "json",
+    options: Sequence[str] = (),
+    result_encoding: str = "json",
+    artifacts_dir: Optional[Path] = None,
+    limits: Optional[ResourceLimits] = None,
+) -> TaskOutput:
+    """Run task code in a fresh interpreter through _runner.py"""
+    with measure("encode") as encoding:
+        request = encode_request(code, inputs, input_encoding)
+        encoding.nbytes = len(request)
+    fd, result_path = tempfile.mkstemp(prefix='enact-result-', dir=RESULT_DIR)
+    os.close(fd)
+    args = [str(RUNNER_SCRIPT), input_encoding, *options,
+            '--result', result_path, '--result-encoding', result_encoding,
+            '--code', str(dependency_manager.code_cache.path_for(code))]
+    if artifacts_dir is not None:
+        args += ['--artifacts', str(artifacts_dir)]
+    args += _rlimit_args(limits)
+
+    try:
+        if not is_recording():
+            stdout = await dependency_manager.run_python_async(
+                venv_path, args, request, limits, rlimits=False)
+        else:
+            # The runner reports when it started and how long the task took,
+            # so interpreter startup can be told apart from task runtime
+            spawned = time.time()
+            stdout, stderr = await dependency_manager._communicate(
+                venv_path, args + ['--timings'], request, limits,
+                rlimits=False)
+            _, marker, report = stderr.rpartition(TIMINGS_MARKER)
+            if marker:
+                timings = json.loads(report)
+                record("startup", max(timings['started'] - spawned, 0.0))
+                record("run", timings['run'])
+
+        with open(result_path, 'rb') as f:
+            data = f.read()
+    except BaseException:
+        if artifacts_dir is not None:
+            shutil.rmtree(artifacts_dir, ignore_errors=True)
+        raise
+    finally:
+        os.unlink(result_path)
+
+    if not data:
+        return TaskOutput(stdout, artifacts_dir=artifacts_dir)
+    with measure("parse", len(data)):
+        result = decode_result(data, result_encoding)
+    return TaskOutput(stdout, result, artifacts_dir)
+
+
+async def run_profiled(
+    dependency_manager: DependencyManager,
+    venv_path: Path,
+    code: str,
+    inputs: Dict[str, Any],
+    profile: TaskProfile,
+    artifacts_dir: Optional[Path] = None,
+    limits: Optional[ResourceLimits] = None,
+) -> TaskOutput:
+    """Run task code under cProfile in a fresh interpreter
+
+    The profile travels through a temp file rather than the task's output
+    and is stored in ``profile`` even if the task fails.
+    """
+    fd, profile_path = tempfile.mkstemp(prefix='enact-profile-', suffix='.prof')
+    os.close(fd)
+    try:
+        return await run_in_runner(
+            dependency_manager, venv_path, code, inputs,
+            options=['--profile', profile_path], artifacts_dir=artifacts_dir,
+            limits=limits)
+    finally:
+        data = Path(profile_path).read_bytes()
+        os.unlink(profile_path)
+        if data:
+            profile.data = data
+
+
+async def stream_in_runner(
+    dependency_manager: DependencyManager,
+    venv_path: Path,
+    code: str,
+    inputs: Dict[str, Any],
+    input_encoding: str = "json",
+    **options,
+) -> AsyncIterator[bytes]:
+    """Run task code in a fresh interpreter, yielding stdout lines as written
+
+    ``options`` are passed on to DependencyManager.stream_python_async().
+    """
+    with measure("encode") as encoding:
+        request = encode_request(code, inputs, input_encoding)
+        encoding.nbytes = len(request)
+    code_path = dependency_manager.code_cache.path_for(code)
+    lines = dependency_manager.stream_python_async(
+        venv_path,
+        [str(RUNNER_SCRIPT), input_encoding, '--stream', '--code', str(code_path),
+         *_rlimit_args(options.get('limits'))],
+        request, rlimits=False, **options)
+    try:
+        async for line in lines:
+            yield line
+    finally:
+        await lines.aclose()
+
+
+def _rlimit_args(limits: Optional[ResourceLimits]) -> List[str]:
+    # The runner applies them to itself, so spawning needs no preexec_fn
+    rlimits = child_rlimits(limits)
+    return ['--rlimits', json.dumps(rlimits)] if rlimits else []
+
+
+class ExecutionBackend:
+    """Runs task code with its inputs inside a venv
+
+    ``run`` returns a TaskOutput (older backends may return plain stdout).
+    Files saved with ``save_artifact()`` go to a fresh directory under
+    ``artifacts_root`` for every run. ``limits`` is only passed when the
+    run has ResourceLimits; the executor enforces their timeout itself.
+    """
+
+    # Backends running tasks in this interpreter set this to skip the venv
+    requires_venv = True
+
+    def __init__(
+        self,
+        dependency_manager: DependencyManager,
+        artifacts_root: Optional[Path] = None,
+    ):
+        self.dependency_manager = dependency_manager
+        self.artifacts_root = artifacts_root or DEFAULT_ARTIFACTS_DIR
+
+    async def run(
+        self,
+        venv_path: Path,
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits] = None,
+    ) -> TaskOutput:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Release any processes or resources held by the backend"""
+
+    def new_artifacts_dir(self) -> Path:
+        """Directory for one run's artifacts; only created if one is saved"""
+        return self.artifacts_root / uuid.uuid4().hex
+
+
+class SubprocessBackend(ExecutionBackend):
+    """Run every execution in a fresh interpreter (the default)
+
+    The interpreter runs a static runner script and receives the task code
+    and inputs over stdin, so nothing is written to disk per execution.
+    Use ``input_encoding="pickle"`` for large binary or numeric inputs that
+    JSON cannot represent compactly, and ``result_encoding="marshal"`` for a
+    faster, binary-safe encoding of results passed to ``set_result()``.
+    """
+
+    def __init__(
+        self,
+        dependency_manager: DependencyManager,
+        input_encoding: str = "json",
+        result_encoding: str = "json",
+        artifacts_root: Optional[Path] = None,
+    ):
+        super().__init__(dependency_manager, artifacts_root)
+        if input_encoding not in INPUT_ENCODINGS:
+            raise ValueError(
+                f"Unknown input encoding {input_encoding!r}; "
+                f"expected one of {INPUT_ENCODINGS}")
+        if result_encoding not in RESULT_ENCODINGS:
+            raise ValueError(
+                f"Unknown result encoding {result_encoding!r}; "
+                f"expected one of {RESULT_ENCODINGS}")
+        self.input_encoding = input_encoding
+        self.result_encoding = result_encoding
+
+    async def run(
+        self,
+        venv_path: Path,
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits] = None,
+    ) -> TaskOutput:
+        return await run_in_runner(
+            self.dependency_manager, venv_path, code, inputs,
+            self.input_encoding, result_encoding=self.result_encoding,
+            artifacts_dir=self.new_artifacts_dir(), limits=limits)
+
+
+class WorkerPoolBackend(ExecutionBackend):
+    """Run executions on warm, long-lived interpreters for each venv
+
+    Imported modules stay loaded between tasks, so tasks share interpreter
+    state; see WorkerPool for the recycling options. CPU and memory limits
+    need a process per run and are not enforced here; a worker that times
+    out or overruns its output limit is killed.
+    """
+
+    def __init__(
+        self,
+        dependency_manager: DependencyManager,
+        artifacts_root: Optional[Path] = None,
+        **pool_options,
+    ):
+        super().__init__(dependency_manager, artifacts_root)
+        self.pool = WorkerPool(**pool_options)
+        self._held: Set[Path] = set()
+
+    async def run(
+        self,
+        venv_path: Path,
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits] = None,
+    ) -> TaskOutput:
+        if venv_path not in self._held:
+            # Workers may outlive a run, so keep their venv from eviction
+            self.dependency_manager.hold(venv_path)
+            self._held.add(venv_path)
+        python_path = self.dependency_manager._get_python_path(venv_path)
+        with measure("run"):
+            return await self.pool.run(
+                python_path, code, inputs, self.new_artifacts_dir(),
+                limits.max_output_bytes if limits else None,
+                self.dependency_manager.code_cache.path_for(code))
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+        while self._held:
+            self.dependency_manager.release(self._held.pop())
+
+
+class ForkServerBackend(ExecutionBackend):
+    """Fork every execution from a per-venv zygote (POSIX only)
+
+    The zygote pre-imports the venv's packages plus any ``preload`` modules,
+    so each run gets a clean process without paying the import cost again.
+    Forked children apply CPU and memory limits to themselves.
+    """
+
+    def __init__(
+        self,
+        dependency_manager: DependencyManager,
+        preload: Optional[List[str]] = None,
+        artifacts_root: Optional[Path] = None,
+    ):
+        super().__init__(dependency_manager, artifacts_root)
+        self.preload = list(preload or [])
+        self._servers: Dict[Path, ForkServer] = {}
+        self._starting = SingleFlight()
+
+    async def run(
+        self,
+        venv_path: Path,
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits] = None,
+    ) -> TaskOutput:
+        server = self._servers.get(venv_path)
+        if server is None or not server.alive:
+            server = await self._starting.do(
+                venv_path, lambda: self._start(venv_path))
+        with measure("run"):
+            return await server.run(
+                code, inputs, self.new_artifacts_dir(), limits,
+                self.dependency_manager.code_cache.path_for(code))
+
+    async def aclose(self) -> None:
+        while self._servers:
+            venv_path, server = self._servers.popitem()
+            await server.stop()
+            self.dependency_manager.release(venv_path)
+
+    async def _start(self, venv_path: Path) -> ForkServer:
+        previous = self._servers.pop(venv_path, None)
+        if previous is not None:
+            await previous.stop()
+            self.dependency_manager.release(venv_path)
+        server = ForkServer(
+            self.dependency_manager._get_python_path(venv_path),
+            self.preload + self.dependency_manager.get_venv_packages(venv_path),
+        )
+        await server.start()
+        # The zygote lives on between runs, so keep its venv from eviction
+        self.dependency_manager.hold(venv_path)
+        self._servers[venv_path] = server
+        return server
+
+
+class InProcessBackend(ExecutionBackend):
+    """Run trusted, dependency-free tasks on threads in this interpreter
+
+    No venv is built and no interpreter started, so trivial tasks finish
+    in microseconds. Task code shares the caller's process and can read or
+    break anything in it, so only opt in for code you trust. Tasks that
+    declare packages are rejected, CPU and memory limits are not enforced,
+    and a task that times out keeps its thread until it returns.
+    """
+
+    requires_venv = False
+
+    def __init__(
+        self,
+        dependency_manager: DependencyManager,
+        artifacts_root: Optional[Path] = None,
+        max_workers: int = 4,
+    ):
+        super().__init__(dependency_manager, artifacts_root)
+        self.runner = InProcessRunner(max_workers)
+
+    async def run(
+        self,
+        venv_path: Optional[Path],
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits] = None,
+    ) -> TaskOutput:
+        compiled = await self.dependency_manager.code_cache.compile_async(code)
+        with measure("run"):
+            return await self.runner.run(
+                compiled, inputs, self.new_artifacts_dir(),
+                limits.max_output_bytes if limits else None)
+
+    async def aclose(self) -> None:
+        self.runner.close()
+
+
+BACKENDS = {
+    "subprocess": SubprocessBackend,
+    "pool": WorkerPoolBackend,
+    "forkserver": ForkServerBackend,
+    "inprocess": InProcessBackend,
+}
+
+
+def create_backend(
+    name: str, dependency_manager: DependencyManager, **options
+) -> ExecutionBackend:
+    """Create an execution backend by name"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown execution backend {name!r}; "
+            f"expected one of {sorted(BACKENDS)}")
+    return backend_class(dependency_manager, **options)
@@ -0,0 +1,345 @@
+# src/enact/cache.py
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .models import EnactTask
+
+DEFAULT_TASK_CACHE_DIR = Path.home() / '.enact' / 'tasks'
+DEFAULT_RESULT_CACHE_DIR = Path.home() / '.enact' / 'results'
+
+
+class CacheStats:
+    """Counters describing how well a cache is doing"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "revalidations": self.revalidations,
+            "hit_rate": self.hit_rate,
+        }
+
+    def __repr__(self) -> str:
+        return f"CacheStats({self.as_dict()})"
+
+
+class CachedTask:
+    """A validated task definition together with its HTTP validators"""
+
+    def __init__(
+        self,
+        task: EnactTask,
+        definition: Dict[str, Any],
+        expires_at: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        self.task = task
+        self.definition = definition
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class TaskCache:
+    """LRU cache of task definitions with a TTL and optional disk tier
+
+    Entries live in memory for ``ttl`` seconds, after which they are kept
+    around (up to ``maxsize``) only to be revalidated with the registry.
+    When ``cache_dir`` is set, definitions are also written to disk so that
+    new processes start warm. A ``maxsize`` of 0 disables caching.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 256,
+        ttl: float = 300.0,
+        cache_dir: Optional[Path] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, CachedTask]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[CachedTask]:
+        """Look up an entry, which may be stale; records a hit or a miss"""
+        if self.maxsize <= 0:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._store(key, entry)
+        else:
+            self._entries.move_to_end(key)
+
+        if entry is not None and entry.is_fresh():
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+        return entry
+
+    def put(
+        self,
+        key: str,
+        task: EnactTask,
+        definition: Dict[str, Any],
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """Cache a freshly fetched task definition"""
+        if self.maxsize <= 0:
+            return
+        entry = CachedTask(
+            task, definition, time.time() + self.ttl, etag, last_modified)
+        self._store(key, entry)
+        self._save(key, entry)
+
+    def refresh(self, key: str) -> Optional[CachedTask]:
+        """Extend the lifetime of an entry the registry reported unchanged"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry.expires_at = time.time() + self.ttl
+        self.stats.revalidations += 1
+        self._save(key, entry)
+        return entry
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+        path = self._path(key)
+        if path is not None:
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob('*.json'):
+                path.unlink(missing_ok=True)
+
+    def _store(self, key: str, entry: CachedTask) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _path(self, key: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return self.cache_dir / f"{name}.json"
+
+    def _load(self, key: str) -> Optional[CachedTask]:
+        path = self._path(key)
+        if path is None or not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                record = json.load(f)
+            if record.get('key') != key:
+                return None
+            return CachedTask(
+                EnactTask.model_validate(record['definition']),
+                record['definition'],
+                record['expires_at'],
+                record.get('etag'),
+                record.get('last_modified'),
+            )
+        except (OSError, ValueError, KeyError):
+            # A corrupt or outdated record is simply a miss
+            return None
+
+    def _save(self, key: str, entry: CachedTask) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        record = {
+            'key': key,
+            'expires_at': entry.expires_at,
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'definition': entry.definition,
+        }
+        # Write to a temp file and rename so readers never see partial data
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(record, f)
+            os.replace(tmp_name, path)
+        except OSError:
+            Path(tmp_name).unlink(missing_ok=True)
+
+
+class ResultCache:
+    """Memoized results of deterministic task executions
+
+    Only tasks whose definition sets ``cacheable: true`` are cached. Keys
+    cover the task id and version, a hash of its code and dependencies and
+    the canonical JSON of its inputs. Results are held as JSON so callers
+    always get a private copy. The memory tier keeps ``maxsize`` entries;
+    the optional disk tier is capped at ``max_disk_bytes`` and evicts the
+    least recently used files first.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        cache_dir: Optional[Path] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._disk_bytes = 0
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(
+                p.stat().st_size for p in self.cache_dir.glob('*.json'))
+
+    @staticmethod
+    def make_key(
+        task: EnactTask, code: str, dependency_hash: str, inputs: Dict[str, Any]
+    ) -> Optional[str]:
+        """Cache key for an execution, or None if inputs aren't JSON"""
+        try:
+            canonical_inputs = json.dumps(
+                inputs, sort_keys=True, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+        parts = [
+            task.id,
+            task.version,
+            hashlib.sha256(code.encode()).hexdigest(),
+            dependency_hash,
+            hashlib.sha256(canonical_inputs.encode()).hexdigest(),
+        ]
+        return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        else:
+            data = self._load(key)
+            if data is not None:
+                self._store(key, data)
+
+        if data is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(data)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        try:
+            data = json.dumps(result)
+        except (TypeError, ValueError):
+            return
+        self._store(key, data)
+        self._save(key, data)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob('*.json'):
+                path.unlink(missing_ok=True)
+            self._disk_bytes = 0
+
+    def _store(self, key: str, data: str) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def _load(self, key: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.json"
+        try:
+            data = path.read_text()
+            # Touch the file so disk eviction is least-recently-used
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _save(self, key: str, data: str) -> None:
+        if self.cache_dir is None or len(data) > self.max_disk_bytes:
+            return
+        path = self.cache_dir / f"{key}.json"
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            previous = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_name, path)
+        except OSError:
+            Path(tmp_name).unlink(missing_ok=True)
+            return
+        self._disk_bytes += path.stat().st_size - previous
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        files = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        self._disk_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._disk_bytes -= size
+            self.stats.evictions += 1
@@ -0,0 +1,187 @@
+# src/enact/cli.py
+import argparse
+import asyncio
+import json
+import re
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from .cache import DEFAULT_TASK_CACHE_DIR, TaskCache
+from .dependency_manager import CODE_MAX_AGE, DependencyManager
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte count such as 500M or 10G"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', value, re.I)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: int) -> str:
+    for unit in ['B', 'KiB', 'MiB', 'GiB']:
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def gc(args: argparse.Namespace) -> int:
+    manager = DependencyManager(args.cache_dir)
+    evicted = manager.prune(
+        max_bytes=args.max_bytes,
+        max_entries=args.max_entries,
+        min_idle=args.min_idle,
+        dry_run=args.dry_run,
+        code_max_age=args.code_max_age,
+    )
+    action = "Would evict" if args.dry_run else "Evicted"
+    for venv in evicted:
+        print(f"{action} {venv.env_hash} ({format_size(venv.size)})")
+
+    remaining = len(manager.list_venvs())
+    if args.dry_run:
+        remaining -= len(evicted)
+    freed = sum(v.size for v in evicted)
+    print(f"{action} {len(evicted)} venv(s), {format_size(freed)}; "
+          f"{remaining} cached")
+    return 0
+
+
+def export(args: argparse.Namespace) -> int:
+    manager = DependencyManager(args.cache_dir)
+    manager.export_venv(args.env_hash, args.archive)
+    print(f"Exported {args.env_hash} to {args.archive}")
+    return 0
+
+
+def import_(args: argparse.Namespace) -> int:
+    manager = DependencyManager(args.cache_dir)
+    venv_path = manager.import_venv(args.archive)
+    print(f"Imported {venv_path.name} into {venv_path.parent}")
+    return 0
+
+
+def load_manifest(path: Path) -> List[str]:
+    """Task ids from a JSON list (or {"tasks": [...]}) or one id per line"""
+    text = path.read_text()
+    if path.suffix == '.json':
+        data = json.loads(text)
+        return list(data['tasks'] if isinstance(data, dict) else data)
+    lines = (line.split('#', 1)[0].strip() for line in text.splitlines())
+    return [line for line in lines if line]
+
+
+def warm(args: argparse.Namespace) -> int:
+    from .client import EnactClient
+
+    task_ids = list(args.task_ids)
+    for manifest in args.manifest:
+        task_ids.extend(load_manifest(manifest))
+    if not task_ids:
+        print("No tasks to warm", file=sys.stderr)
+        return 2
+
+    async def run():
+        async with EnactClient(
+            args.registry,
+            task_cache=TaskCache(cache_dir=args.task_cache_dir),
+            dependency_manager=DependencyManager(args.cache_dir),
+        ) as client:
+            return await client.warm(task_ids, concurrency=args.concurrency)
+
+    results = asyncio.run(run())
+    for result in results:
+        if result.ok:
+            print(f"{result.task_id}: fetch {result.fetch_seconds:.2f}s, "
+                  f"venv {result.venv_seconds:.2f}s ({result.env_hash})")
+        else:
+            print(f"{result.task_id}: failed: {result.error}")
+    failed = sum(not result.ok for result in results)
+    print(f"Warmed {len(results) - failed} task(s), {failed} failed")
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="enact", description="Enact Python SDK utilities")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gc_parser = commands.add_parser(
+        "gc", aliases=["prune"],
+        help="evict least recently used virtual environments")
+    gc_parser.add_argument(
+        "--cache-dir", type=Path, default=None,
+        help="venv cache directory (default: ~/.enact/venvs)")
+    gc_parser.add_argument(
+        "--max-bytes", type=parse_size, default=None,
+        help="keep the cache below this size, e.g. 20G")
+    gc_parser.add_argument(
+        "--max-entries", type=int, default=None,
+        help="keep at most this many venvs")
+    gc_parser.add_argument(
+        "--min-idle", type=float, default=60.0,
+        help="never evict venvs used within this many seconds")
+    gc_parser.add_argument(
+        "--code-max-age", type=float, default=CODE_MAX_AGE,
+        help="delete compiled task code unused for this many seconds "
+             "(default: a week)")
+    gc_parser.add_argument(
+        "--dry-run", action="store_true",
+        help="only report what would be evicted")
+    gc_parser.set_defaults(handler=gc)
+
+    export_parser = commands.add_parser(
+        "export", help="write a cached venv to a relocatable archive")
+    export_parser.add_argument("env_hash", help="hash of the cached venv")
+    export_parser.add_argument("archive", type=Path, help="archive to write")
+    export_parser.add_argument(
+        "--cache-dir", type=Path, default=None,
+        help="venv cache directory (default: ~/.enact/venvs)")
+    export_parser.set_defaults(handler=export)
+
+    import_parser = commands.add_parser(
+        "import", help="install a venv archive into the cache")
+    import_parser.add_argument("archive", type=Path, help="archive to read")
+    import_parser.add_argument(
+        "--cache-dir", type=Path, default=None,
+        help="venv cache directory (default: ~/.enact/venvs)")
+    import_parser.set_defaults(handler=import_)
+
+    warm_parser = commands.add_parser(
+        "warm", help="fetch task definitions and build their venvs ahead of use")
+    warm_parser.add_argument("task_ids", nargs="*", help="tasks to warm")
+    warm_parser.add_argument(
+        "--manifest", type=Path, action="append", default=[],
+        help="file listing task ids, one per line or as a JSON list")
+    warm_parser.add_argument(
+        "--registry", default="http://localhost:8080",
+        help="registry URL (default: http://localhost:8080)")
+    warm_parser.add_argument(
+        "--concurrency", type=int, default=4,
+        help="tasks to warm at once")
+    warm_parser.add_argument(
+        "--cache-dir", type=Path, default=None,
+        help="venv cache directory (default: ~/.enact/venvs); task "
+             "definitions go to --task-cache-dir")
+    warm_parser.add_argument(
+        "--task-cache-dir", type=Path, default=DEFAULT_TASK_CACHE_DIR,
+        help="where task definitions are saved (default: ~/.enact/tasks); "
+             "clients only read them with TaskCache(cache_dir=...) set to "
+             "the same directory")
+    warm_parser.set_defaults(handler=warm)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
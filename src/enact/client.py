@@ -1,83 +1,399 @@
 # src/enact/client.py
-import httpx
+import asyncio
 import json
-from typing import Dict, Any, List
-from .models import EnactTask, SearchResult
+import logging
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
+
+import httpx
+
+from .backends import ExecutionBackend
+from .cache import CachedTask, ResultCache, TaskCache
+from .dependency_manager import DependencyManager
 from .executor import TaskExecutor
+from .metrics import Instrumentation, Timings, measure, recording
+from .models import EnactTask, ExecutionResult, ResourceLimits, SearchResult, WarmResult
+from .profiling import TaskProfile
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+TimeoutTypes = Union[None, float, httpx.Timeout]
 
 
 class EnactClient:
-    def __init__(self, api_base_url: str):
-        self.api_base_url = api_base_url
-        self.executor = TaskExecutor()
+    def __init__(
+        self,
+        api_base_url: str,
+        *,
+        timeout: TimeoutTypes = 10.0,
+        max_connections: Optional[int] = 100,
+        max_keepalive_connections: Optional[int] = 20,
+        keepalive_expiry: Optional[float] = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        task_cache: Optional[TaskCache] = None,
+        backend: Union[str, ExecutionBackend] = "subprocess",
+        result_cache: Optional[ResultCache] = None,
+        dependency_manager: Optional[DependencyManager] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        resource_limits: Optional[ResourceLimits] = None,
+    ):
+        self.api_base_url = api_base_url.rstrip("/")
+        self.executor = TaskExecutor(
+            backend, dependency_manager=dependency_manager,
+            result_cache=result_cache, instrumentation=instrumentation,
+            limits=resource_limits)
+        # Pass TaskCache(maxsize=0) to always go to the registry
+        self.task_cache = task_cache if task_cache is not None else TaskCache()
+        self._inflight = SingleFlight()
+
+        # Settings for the shared connection pool; the pool itself is created
+        # lazily so that a client can be constructed outside of an event loop.
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Shared HTTP client used for every registry call"""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.api_base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2,
+                transport=self._transport,
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        """Close the shared connection pool and execution backend"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await self.executor.aclose()
+
+    async def __aenter__(self) -> "EnactClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.aclose()
 
-    async def search_tasks(self, query: str) -> List[SearchResult]:
+    async def search_tasks(
+        self, query: str, *, timeout: TimeoutTypes = None
+    ) -> List[SearchResult]:
         """Search for tasks based on natural language query"""
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"{self.api_base_url}/api/yaml/search"
-                print(f"Searching tasks with query: {query}")
+            logger.debug("Searching tasks with query: %s", query)
 
-                response = await client.post(
-                    url,
-                    json={"query": query}
-                )
-                response.raise_for_status()
+            response = await self.http.post(
+                "/api/yaml/search",
+                json={"query": query},
+                timeout=_request_timeout(timeout),
+            )
+            response.raise_for_status()
 
-                results = response.json()
-                print("Search results:", json.dumps(results, indent=2))
-                return [SearchResult.model_validate(result) for result in results]
+            results = response.json()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Search results: %s",
+                             json.dumps(results, indent=2))
+            return [SearchResult.model_validate(result) for result in results]
         except httpx.HTTPError as e:
-            print(f"HTTP error in search: {e}")
+            logger.debug("HTTP error in search: %s", e)
             raise
         except Exception as e:
-            print(f"Error in search_tasks: {e}")
+            logger.debug("Error in search_tasks: %s", e)
             raise
 
-    async def get_task(self, task_id: str) -> EnactTask:
+    async def get_task(
+        self, task_id: str, *, timeout: TimeoutTypes = None
+    ) -> EnactTask:
         """Fetch task definition from registry"""
+        url = f"/api/yaml/tasks/{task_id}"
+        cache_key = f"{self.api_base_url}{url}"
+        cached = self.task_cache.get(cache_key)
+        if cached is not None and cached.is_fresh():
+            return cached.task
+
+        # Concurrent fetches of the same definition share one request
+        return await self._inflight.do(
+            cache_key,
+            lambda: self._fetch_task(url, cache_key, cached, timeout),
+        )
+
+    async def get_tasks(
+        self, task_ids: Iterable[str], *, concurrency: int = 10
+    ) -> List[EnactTask]:
+        """Fetch many task definitions concurrently, in input order"""
+        _check_concurrency(concurrency)
+        task_ids = list(task_ids)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(task_id: str) -> EnactTask:
+            async with semaphore:
+                return await self.get_task(task_id)
+
+        unique_ids = list(dict.fromkeys(task_ids))
+        tasks = await asyncio.gather(*(fetch(i) for i in unique_ids))
+        by_id = dict(zip(unique_ids, tasks))
+        return [by_id[task_id] for task_id in task_ids]
+
+    async def warm(
+        self, task_ids: Iterable[str], *, concurrency: int = 4
+    ) -> List[WarmResult]:
+        """Fetch definitions and build venvs for tasks ahead of their use
+
+        Up to ``concurrency`` tasks are warmed at once; tasks sharing
+        dependencies share one venv build. Failures are reported per task.
+        """
+        _check_concurrency(concurrency)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm_one(task_id: str) -> WarmResult:
+            async with semaphore:
+                result = WarmResult(task_id=task_id)
+                started = time.perf_counter()
+                try:
+                    task = await self.get_task(task_id)
+                    fetched = time.perf_counter()
+                    result.fetch_seconds = fetched - started
+                    venv_path = await self.executor.prepare(task)
+                    result.venv_seconds = time.perf_counter() - fetched
+                    if venv_path is not None:
+                        self.executor.dependency_manager.release(venv_path)
+                        result.env_hash = venv_path.name
+                except Exception as e:
+                    logger.debug("Warming %s failed: %s", task_id, e)
+                    result.error = str(e)
+                return result
+
+        unique_ids = list(dict.fromkeys(task_ids))
+        return list(await asyncio.gather(*(warm_one(i) for i in unique_ids)))
+
+    async def _fetch_task(
+        self,
+        url: str,
+        cache_key: str,
+        cached: Optional[CachedTask],
+        timeout: TimeoutTypes,
+    ) -> EnactTask:
         try:
-            async with httpx.AsyncClient() as client:
-                url = f"{self.api_base_url}/api/yaml/tasks/{task_id}"
-                print(f"Requesting URL: {url}")
-                response = await client.get(url)
-                response.raise_for_status()
+            logger.debug("Requesting URL: %s", cache_key)
+            with measure("fetch") as fetch:
+                response = await self.http.get(
+                    url,
+                    headers=cached.validators() if cached else None,
+                    timeout=_request_timeout(timeout),
+                )
+                fetch.nbytes = len(response.content)
+            if response.status_code == 304 and cached is not None:
+                self.task_cache.refresh(cache_key)
+                return cached.task
+            response.raise_for_status()
 
-                data = response.json()
-                if 'protocolDetails' not in data:
-                    raise ValueError(
-                        f"Response missing protocolDetails: {data}")
+            data = response.json()
+            if 'protocolDetails' not in data:
+                raise ValueError(
+                    f"Response missing protocolDetails: {data}")
 
-                protocol_details = data['protocolDetails']
-                if 'type' not in protocol_details and 'type' in data:
-                    protocol_details['type'] = data['type']
+            protocol_details = data['protocolDetails']
+            if 'type' not in protocol_details and 'type' in data:
+                protocol_details['type'] = data['type']
 
-                print("Protocol details to validate:",
-                      json.dumps(protocol_details, indent=2))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Protocol details to validate: %s",
+                             json.dumps(protocol_details, indent=2))
 
-                return EnactTask.model_validate(protocol_details)
+            with measure("validate"):
+                task = EnactTask.model_validate(protocol_details)
+            self.task_cache.put(
+                cache_key,
+                task,
+                protocol_details,
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+            )
+            return task
         except httpx.HTTPError as e:
-            print(f"HTTP error occurred: {e}")
+            logger.debug("HTTP error occurred: %s", e)
             raise
-        except json.JSONDecodeError as e:
-            print(
-                f"Failed to parse JSON response. Response text: {response.text}")
+        except json.JSONDecodeError:
+            logger.debug(
+                "Failed to parse JSON response. Response text: %s",
+                response.text)
             raise
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            logger.debug("Unexpected error: %s", e)
             raise
 
-    async def execute_task(self, task_id: str, inputs: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a task locally with given inputs"""
-        try:
-            print(f"Fetching task: {task_id}")
-            task = await self.get_task(task_id)
+    async def execute_task(
+        self,
+        task_id: str,
+        inputs: Dict[str, Any],
+        *,
+        timings: Optional[Timings] = None,
+        profile: Optional[TaskProfile] = None,
+        limits: Optional[ResourceLimits] = None,
+    ) -> Dict[str, Any]:
+        """Execute a task locally with given inputs
 
-            print(f"Creating script with inputs: {inputs}")
-            script = self.executor.create_script(task, inputs)
+        Pass a Timings object to receive the per-phase breakdown of the call,
+        or a TaskProfile to profile the task code with cProfile. ``limits``
+        override the client's and the task's ResourceLimits for this call.
+        """
+        try:
+            with recording(self.executor.instrumentation, timings, task_id):
+                logger.debug("Fetching task: %s", task_id)
+                task = await self.get_task(task_id)
 
-            print(f"Generated script:\n{script}")
-            return self.executor.execute_locally(task, script)
+                logger.debug("Executing with inputs: %s", inputs)
+                return await self.executor.run(
+                    task, inputs, profile=profile, limits=limits)
         except Exception as e:
-            print(f"Error in execute_task: {e}")
+            logger.debug("Error in execute_task: %s", e)
             raise
+
+    async def execute_task_stream(
+        self,
+        task_id: str,
+        inputs: Dict[str, Any],
+        *,
+        max_record_bytes: int = 1024 * 1024,
+        stderr_spill_bytes: int = 1024 * 1024,
+        limits: Optional[ResourceLimits] = None,
+    ) -> AsyncIterator[Any]:
+        """Execute a task and yield the NDJSON records it emits as it runs
+
+        Memory use stays bounded however much the task outputs: a slow
+        consumer pauses the task, and stderr beyond ``stderr_spill_bytes``
+        goes to a temp file. Closing the generator stops the task, so wrap
+        it in ``contextlib.aclosing()`` or call ``aclose()`` when leaving
+        the loop early; merely breaking out leaves the task running until
+        the generator is garbage collected.
+        """
+        task = await self.get_task(task_id)
+        records = self.executor.stream(
+            task, inputs, max_record_bytes=max_record_bytes,
+            stderr_spill_bytes=stderr_spill_bytes, limits=limits)
+        try:
+            async for record in records:
+                yield record
+        finally:
+            await records.aclose()
+
+    async def execute_many(
+        self,
+        task_id: str,
+        inputs_iter: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+        *,
+        concurrency: int = 8,
+        ordered: bool = False,
+        timings: bool = False,
+        limits: Optional[ResourceLimits] = None,
+    ) -> AsyncIterator[ExecutionResult]:
+        """Execute one task over many input sets with bounded concurrency
+
+        The task definition and its venv are resolved once up front, and
+        the venv is held against eviction until the batch ends. Results
+        are yielded as they complete (or in input order with ``ordered=True``)
+        and a failing item is reported in its result instead of aborting the
+        batch. At most ``concurrency`` items are in flight or buffered.
+        With ``timings=True`` each result carries its phase breakdown.
+        ``limits`` apply to each item separately.
+        """
+        _check_concurrency(concurrency)
+        task = await self.get_task(task_id)
+        venv_path = await self.executor.prepare(task)
+
+        async def run(index: int, inputs: Dict[str, Any]) -> ExecutionResult:
+            result = ExecutionResult(index=index, inputs=inputs)
+            item_timings = Timings() if timings else None
+            try:
+                result.output = await self.executor.run(
+                    task, inputs, venv_path, timings=item_timings,
+                    limits=limits)
+            except Exception as e:
+                result.error = str(e)
+            if item_timings is not None:
+                result.timings = item_timings.as_dict()
+            return result
+
+        pending = set()
+        finished: Dict[int, ExecutionResult] = {}
+        next_index = 0
+
+        def ready() -> List[ExecutionResult]:
+            nonlocal next_index
+            if not ordered:
+                results = list(finished.values())
+                finished.clear()
+                return results
+            results = []
+            while next_index in finished:
+                results.append(finished.pop(next_index))
+                next_index += 1
+            return results
+
+        async def drain() -> List[ExecutionResult]:
+            nonlocal pending
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                finished[result.index] = result
+            return ready()
+
+        try:
+            index = 0
+            async for inputs in _aiter(inputs_iter):
+                while len(pending) + len(finished) >= concurrency:
+                    for result in await drain():
+                        yield result
+                pending.add(asyncio.ensure_future(run(index, inputs)))
+                index += 1
+            while pending:
+                for result in await drain():
+                    yield result
+        finally:
+            # The consumer may stop early; don't leave work running
+            for future in pending:
+                future.cancel()
+            if venv_path is not None:
+                self.executor.dependency_manager.release(venv_path)
+
+
+def _request_timeout(timeout: TimeoutTypes):
+    """Fall back to the pool-wide timeout when no per-request one is given"""
+    return httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
+
+async def _aiter(items):
+    """Iterate a sync or async iterable asynchronously"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def _check_concurrency(concurrency: int) -> None:
+    # Zero would never start anything (or fail on the first item)
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
@@ -0,0 +1,157 @@
+# src/enact/codecache.py
+import asyncio
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from types import CodeType
+from typing import List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Must match _worker.py, so tracebacks and profiles look the same
+TASK_FILENAME = '<task>'
+# How often code kept in memory has its compiled file's use recorded
+REFRESH_INTERVAL = 3600.0
+
+
+class CodeCache:
+    """Task code compiled once per code and interpreter version
+
+    Code objects are kept in memory for in-process execution and written to
+    ``root/<cache tag>/<sha256 of the code>.code`` (the cache tag is e.g.
+    ``cpython-311``), where later clients and the interpreters running
+    tasks load them instead of compiling the source again. Code that fails
+    to compile is remembered as well, so a syntax error surfaces once,
+    before any process starts.
+
+    A compiled file's mtime records its last use, at most every
+    REFRESH_INTERVAL seconds for code kept in memory, and ``prune`` removes
+    files unused for longer than a given age.
+    """
+
+    def __init__(self, root: Path, maxsize: int = 256):
+        self.root = Path(root)
+        self.maxsize = maxsize
+        # Task code -> (code object or error message, compiled code path,
+        # when the file's use was last recorded)
+        self._entries: (
+            "OrderedDict[str, Tuple[Union[CodeType, str], Path, float]]"
+        ) = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, code: str) -> CodeType:
+        """The compiled task code; raises ValueError if it doesn't compile"""
+        return self._entry(code)[0]
+
+    async def compile_async(self, code: str) -> CodeType:
+        """compile(), doing any compiling and file I/O off the event loop"""
+        if self._lookup(code) is None:
+            return (await asyncio.to_thread(self._entry, code))[0]
+        return self._entry(code)[0]
+
+    def path_for(self, code: str) -> Path:
+        """Where this interpreter's compiled form of the code is stored"""
+        return self._entry(code)[1]
+
+    def prune(self, max_age: float, dry_run: bool = False) -> List[Path]:
+        """Delete compiled code unused for ``max_age`` seconds
+
+        Returns the deleted (or, with ``dry_run``, the would-be deleted)
+        files. Runs that find their file gone simply compile the code.
+        """
+        cutoff = time.time() - max_age
+        removed = []
+        for path in self.root.glob('*/*'):
+            if path.suffix not in ('.code', '.tmp'):
+                continue
+            try:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    path.unlink()
+            except OSError:
+                continue
+            removed.append(path)
+        return removed
+
+    def _lookup(self, code: str) -> Optional[Tuple[CodeType, Path]]:
+        """The entry for code if it is in memory and needs no refresh"""
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None or time.monotonic() - entry[2] > REFRESH_INTERVAL:
+                return None
+            self._entries.move_to_end(code)
+        compiled, path, _ = entry
+        if isinstance(compiled, str):
+            raise ValueError(compiled)
+        return compiled, path
+
+    def _entry(self, code: str) -> Tuple[CodeType, Path]:
+        entry = self._lookup(code)
+        if entry is not None:
+            return entry
+        compiled, path = self._load(code)
+        with self._lock:
+            self._entries[code] = (compiled, path, time.monotonic())
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        if isinstance(compiled, str):
+            raise ValueError(compiled)
+        return compiled, path
+
+    def _load(self, code: str) -> Tuple[Union[CodeType, str], Path]:
+        digest = hashlib.sha256(code.encode()).hexdigest()
+        path = self.root / sys.implementation.cache_tag / f"{digest}.code"
+        compiled = _read_compiled(path)
+        if compiled is not None:
+            try:
+                # Record the use
+                os.utime(path)
+            except OSError as e:
+                logger.debug("Could not record use of %s: %s", path, e)
+            return compiled, path
+        try:
+            compiled = compile(code, TASK_FILENAME, 'exec')
+        except (SyntaxError, ValueError) as e:
+            return f"Task code does not compile: {e}", path
+        try:
+            # Missing, pruned, or written by another build of this version
+            _write_compiled(path, compiled)
+        except OSError as e:
+            logger.debug("Could not cache compiled code at %s: %s", path, e)
+        return compiled, path
+
+
+def _read_compiled(path: Path) -> Optional[CodeType]:
+    """Code compiled by this interpreter version at path, if it's there"""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if data[:len(MAGIC_NUMBER)] != MAGIC_NUMBER:
+        return None
+    try:
+        compiled = marshal.loads(data[len(MAGIC_NUMBER):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return compiled if isinstance(compiled, CodeType) else None
+
+def _write_compiled(path: Path, compiled: CodeType) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC_NUMBER + marshal.dumps(compiled))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
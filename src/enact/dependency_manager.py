@@ -1,34 +1,210 @@
+import asyncio
 import virtualenv
 import subprocess
 import tempfile
 import os
 import hashlib
 import json
+import logging
+import re
+import shutil
+import sys
+import tarfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from packaging.requirements import Requirement
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.utils import canonicalize_name
+from .artifacts import (
+    ARTIFACT_SUFFIX, ArtifactStore, pack_venv, platform_tag, read_metadata,
+    unpack_venv,
+)
+from .codecache import CodeCache
+from .limits import (
+    Deadline, OutputLimitExceeded, TaskTimeout, exit_error, kill_process_tree,
+    read_limited, spawn_options,
+)
+from .locks import FileLock
+from .metrics import measure
+from .models import ResourceLimits
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Written last, just before a venv is published
+COMPLETE_MARKER = '.enact-complete'
+# Links shared base layers into a venv's site-packages
+LAYERS_PTH = '_enact_layers.pth'
+# Compiled task code unused for this long is pruned with the venvs
+CODE_MAX_AGE = 7 * 24 * 3600.0
+# What _get_env_hash() returns
+ENV_HASH = re.compile(r'[0-9a-f]{12}')
+
+
+class VenvInfo:
+    """A cached venv with its recorded size and last-use time"""
+
+    def __init__(self, path: Path, size: int, last_used: float):
+        self.path = path
+        self.size = size
+        self.last_used = last_used
+
+    @property
+    def env_hash(self) -> str:
+        return self.path.name
+
+    def __repr__(self) -> str:
+        return (f"VenvInfo({self.env_hash!r}, size={self.size}, "
+                f"last_used={self.last_used})")
 
 
 class DependencyManager:
-    def __init__(self, cache_dir: Optional[Path] = None):
-        """Initialize dependency manager with optional cache directory"""
+    def __init__(
+        self,
+        cache_dir: Optional[Path] = None,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        base_layers: Optional[List[List[str]]] = None,
+        resolve_pins: bool = False,
+        wheelhouse: Optional[Path] = None,
+        offline: bool = False,
+        artifact_store: Optional[ArtifactStore] = None,
+    ):
+        """Initialize dependency manager with optional cache directory
+
+        ``max_bytes`` and ``max_entries`` bound the venv cache; least
+        recently used venvs that are not in use are evicted after each new
+        build, or explicitly with prune().
+
+        ``base_layers`` lists requirement sets, e.g.
+        ``[["numpy==1.26.4", "pandas==2.2.2"]]``, that are installed once
+        into shared layers under ``<cache_dir>/.layers``. A new venv that
+        needs any package of a layer links the whole layer in and only
+        installs what the layer doesn't already satisfy. Layers are not
+        subject to eviction.
+
+        With ``resolve_pins``, requirements are first resolved to an exact
+        pinned set (once per distinct spec, remembered under
+        ``<cache_dir>/.resolved``) and venvs are keyed by that set, so tasks
+        with different but compatible ranges share one environment.
+
+        Every build records a lockfile of the exact versions it installed
+        under ``<cache_dir>/.lockfiles`` and keeps their wheels in a shared
+        ``wheelhouse`` (``<cache_dir>/.wheelhouse`` by default). Rebuilding
+        a venv, e.g. after eviction, installs the locked wheels directly
+        without resolving or touching the network. With ``offline`` the
+        index is never used at all.
+
+        With an ``artifact_store``, a venv missing locally is first fetched
+        from the store as a prebuilt archive, and venvs built here are
+        published to it for other nodes.
+
+        Task code is compiled once and cached under ``<cache_dir>/.code``;
+        see CodeCache.
+        """
         self.cache_dir = cache_dir or Path.home() / '.enact' / 'venvs'
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        print(f"Using cache directory: {self.cache_dir}")
+        logger.debug("Using cache directory: %s", self.cache_dir)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.base_layers = [list(layer) for layer in base_layers or []]
+        self.resolve_pins = resolve_pins
+        self._resolved: Dict[str, Dict] = {}
+        self.wheelhouse = wheelhouse or self.cache_dir / '.wheelhouse'
+        self.offline = offline
+        self.artifact_store = artifact_store
+        self.code_cache = CodeCache(self.cache_dir / '.code')
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._building = SingleFlight()
+        self._holds: Dict[Path, int] = {}
+        self._use_locks: Dict[Path, FileLock] = {}
 
     def _get_env_hash(self, dependencies: Dict) -> str:
         """Create a unique hash for the dependencies configuration"""
-        # Sort dependencies to ensure consistent hashing
-        dep_str = json.dumps(dependencies, sort_keys=True)
+        # Canonicalize so that equivalent specs share one venv
+        dep_str = json.dumps(
+            canonicalize_dependencies(dependencies), sort_keys=True)
         return hashlib.sha256(dep_str.encode()).hexdigest()[:12]
 
-    def _get_cached_venv(self, dependencies: Dict) -> Path:
-        """Get or create a cached virtual environment for given dependencies"""
+    def _get_cached_venv(self, dependencies: Dict, hold: bool = False) -> Path:
+        """Get or create a cached virtual environment for given dependencies
+
+        With ``hold``, the venv is returned already held (see hold()), with
+        no window in which it could be evicted; release() it when done.
+        """
+        if self.resolve_pins:
+            dependencies = self._resolve(dependencies)
+        venv_path, built = self._materialize(
+            dependencies, self.cache_dir, hold=hold)
+        if built and (self.max_bytes is not None or self.max_entries is not None):
+            self.prune()
+        return venv_path
+
+    def _materialize(
+        self,
+        dependencies: Dict,
+        root: Path,
+        use_layers: bool = True,
+        hold: bool = False,
+    ) -> Tuple[Path, bool]:
+        """Find or build the venv for dependencies under root
+
+        Returns the venv path and whether this call built it. With ``hold``
+        the venv is held before it is returned.
+        """
+        dependencies = canonicalize_dependencies(dependencies)
         env_hash = self._get_env_hash(dependencies)
-        venv_path = self.cache_dir / env_hash
+        venv_path = root / env_hash
+
+        if self._is_complete(venv_path) and (
+            not hold or self._hold_if_complete(venv_path)
+        ):
+            logger.debug("Using cached virtual environment: %s", env_hash)
+            if not hold:
+                self._touch(venv_path)
+            return venv_path, False
 
-        if not venv_path.exists():
-            print(f"Creating new virtual environment for hash {env_hash}")
-            virtualenv.cli_run([str(venv_path)])
+        # One builder per hash: threads wait on the in-process lock, other
+        # processes on the lock file. Re-check once we hold both. Eviction
+        # also needs the lock file, so holding the venv here is safe.
+        with self._thread_lock(venv_path), FileLock(self._lock_path(venv_path)):
+            built = False
+            if self._is_complete(venv_path):
+                logger.debug("Using cached virtual environment: %s", env_hash)
+            elif self._fetch_artifact(venv_path):
+                built = True
+            else:
+                self._build_venv(env_hash, dependencies, venv_path, use_layers)
+                self._publish_artifact(venv_path)
+                built = True
+            if hold:
+                self.hold(venv_path)
+
+        return venv_path, built
+
+    def _build_venv(
+        self,
+        env_hash: str,
+        dependencies: Dict,
+        venv_path: Path,
+        use_layers: bool = True,
+    ) -> None:
+        """Build a venv in a temp directory and atomically move it into place"""
+        logger.debug("Creating new virtual environment for hash %s", env_hash)
+
+        # Leftovers from builders that crashed; we hold the lock, so no
+        # other build for this hash can be in progress
+        for stale in venv_path.parent.glob(f'.{env_hash}-*'):
+            shutil.rmtree(stale, ignore_errors=True)
+
+        build_path = Path(tempfile.mkdtemp(
+            prefix=f'.{env_hash}-', dir=venv_path.parent))
+        try:
+            virtualenv.cli_run([str(build_path), '--prompt', env_hash])
 
             # Install dependencies in the new environment
             if dependencies.get('python'):
@@ -40,36 +216,516 @@ class DependencyManager:
 
                 # Install required packages
                 if python_deps.get('packages'):
-                    requirements = [
-                        f"{pkg['name']}{pkg['version']}"
-                        for pkg in python_deps['packages']
-                    ]
-                    self._install_packages(venv_path, requirements)
+                    if use_layers:
+                        self._link_layers(build_path, dependencies)
+                    lockfile = self._lockfile_path(venv_path)
+                    with measure('install'):
+                        if not self._install_locked(build_path, lockfile):
+                            requirements = [
+                                f"{pkg['name']}{pkg['version']}"
+                                for pkg in python_deps['packages']
+                            ]
+                            pins = self._install_packages(
+                                build_path, requirements)
+                            if pins is not None:
+                                _write_atomic(lockfile, ''.join(
+                                    f'{pin}\n' for pin in pins))
 
             # Create a marker file with dependency info
-            with open(venv_path / 'dependencies.json', 'w') as f:
+            with open(build_path / 'dependencies.json', 'w') as f:
                 json.dump(dependencies, f)
-        else:
-            print(f"Using cached virtual environment: {env_hash}")
 
+            self._relocate_venv(build_path, venv_path)
+            # The marker records the venv's size; its mtime is the last use
+            with open(build_path / COMPLETE_MARKER, 'w') as f:
+                json.dump({'size': _dir_size(build_path)}, f)
+
+            if venv_path.exists():
+                # An unmarked venv from an older or interrupted build
+                shutil.rmtree(venv_path)
+            os.rename(build_path, venv_path)
+        except BaseException:
+            shutil.rmtree(build_path, ignore_errors=True)
+            raise
+
+    def _resolve(self, dependencies: Dict) -> Dict:
+        """Pin dependencies to the exact versions pip would install today"""
+        dependencies = canonicalize_dependencies(dependencies)
+        packages = (dependencies.get('python') or {}).get('packages')
+        if not packages:
+            return dependencies
+
+        key = self._get_env_hash(dependencies)
+        if key in self._resolved:
+            return self._resolved[key]
+
+        path = self.cache_dir / '.resolved' / f'{key}.json'
+        try:
+            with open(path) as f:
+                resolved = json.load(f)
+        except (OSError, ValueError):
+            resolved = self._resolve_with_pip(dependencies)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(path, json.dumps(resolved))
+
+        self._resolved[key] = resolved
+        return resolved
+
+    def _resolve_with_pip(self, dependencies: Dict) -> Dict:
+        python_deps = dependencies['python']
+        requirements = [
+            f"{pkg['name']}{pkg['version']}" for pkg in python_deps['packages']
+        ]
+        logger.debug("Resolving packages: %s", requirements)
+        try:
+            process = subprocess.run(
+                [sys.executable, '-m', 'pip', 'install', '--dry-run',
+                 '--ignore-installed', '--quiet', '--report', '-']
+                + requirements,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            report = json.loads(process.stdout)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to resolve dependencies: {e.stderr}")
+
+        pinned = [
+            {
+                'name': item['metadata']['name'],
+                'version': f"=={item['metadata']['version']}",
+            }
+            for item in report['install']
+        ]
+        return canonicalize_dependencies(
+            {'python': dict(python_deps, packages=pinned)})
+
+    @property
+    def layers_dir(self) -> Path:
+        return self.cache_dir / '.layers'
+
+    def _select_layers(self, dependencies: Dict) -> List[List[str]]:
+        """Base layers sharing at least one package with the dependencies"""
+        packages = (dependencies.get('python') or {}).get('packages') or []
+        names = {canonicalize_name(pkg['name']) for pkg in packages}
+        return [
+            layer for layer in self.base_layers
+            if any(canonicalize_name(Requirement(r).name) in names for r in layer)
+        ]
+
+    def _get_layer(self, requirements: List[str]) -> Path:
+        """Get or build the shared base layer venv for a requirement set"""
+        packages = []
+        for requirement in sorted(requirements):
+            parsed = Requirement(requirement)
+            packages.append({
+                'name': parsed.name,
+                'version': requirement.strip()[len(parsed.name):].strip(),
+            })
+        layer_path, _ = self._materialize(
+            {'python': {'packages': packages}}, self.layers_dir,
+            use_layers=False)
+        return layer_path
+
+    def _link_layers(self, venv_path: Path, dependencies: Dict) -> None:
+        """Put matching base layers on a venv's path through a .pth file
+
+        pip then treats packages already provided by a layer as installed,
+        and anything the venv installs itself takes precedence over them.
+        """
+        site_packages = self._get_site_packages(venv_path)
+        lines = []
+        for requirements in self._select_layers(dependencies):
+            layer_site = self._get_site_packages(self._get_layer(requirements))
+            # Relative paths keep the link valid if the cache dir moves
+            lines.append(os.path.relpath(layer_site, site_packages))
+        if lines:
+            logger.debug("Linking base layers into %s: %s", venv_path, lines)
+            (site_packages / LAYERS_PTH).write_text('\n'.join(lines) + '\n')
+
+    def _get_site_packages(self, venv_path: Path) -> Path:
+        """Get path to the site-packages directory of a venv"""
+        if os.name == 'nt':  # Windows
+            return venv_path / 'Lib' / 'site-packages'
+        return next((venv_path / 'lib').glob('*/site-packages'))
+
+    def _is_complete(self, venv_path: Path) -> bool:
+        """Only venvs that finished building carry the completion marker"""
+        return (venv_path / COMPLETE_MARKER).exists()
+
+    def _lock_path(self, venv_path: Path) -> Path:
+        return venv_path.parent / '.locks' / f'{venv_path.name}.lock'
+
+    def _use_lock_path(self, venv_path: Path) -> Path:
+        return venv_path.parent / '.locks' / f'{venv_path.name}.use'
+
+    def _touch(self, venv_path: Path) -> None:
+        """Record a use of a venv as its marker's mtime"""
+        try:
+            os.utime(venv_path / COMPLETE_MARKER)
+        except OSError:
+            pass
+
+    def hold(self, venv_path: Path) -> None:
+        """Mark a venv as in use so that it is never evicted
+
+        Holds are counted within the process and shared with other processes
+        through a shared lock on the venv's use-lock file. Every hold also
+        records a use of the venv.
+        """
+        with self._locks_guard:
+            count = self._holds.get(venv_path, 0)
+            if count == 0:
+                lock = FileLock(self._use_lock_path(venv_path))
+                lock.acquire(shared=True)
+                self._use_locks[venv_path] = lock
+            self._holds[venv_path] = count + 1
+        self._touch(venv_path)
+
+    def _hold_if_complete(self, venv_path: Path) -> bool:
+        """Hold a venv unless it was evicted (or never built)"""
+        self.hold(venv_path)
+        # Eviction needs the use-lock we now share, so a venv that is
+        # complete at this point stays put until released
+        if self._is_complete(venv_path):
+            return True
+        self.release(venv_path)
+        return False
+
+    def release(self, venv_path: Path) -> None:
+        """Undo one hold() on a venv"""
+        with self._locks_guard:
+            count = self._holds.get(venv_path, 0) - 1
+            if count > 0:
+                self._holds[venv_path] = count
+                return
+            self._holds.pop(venv_path, None)
+            lock = self._use_locks.pop(venv_path, None)
+        if lock is not None:
+            lock.release()
+
+    @contextmanager
+    def using(self, venv_path: Path) -> Iterator[Path]:
+        """Hold a venv for the duration of a block"""
+        self.hold(venv_path)
+        try:
+            yield venv_path
+        finally:
+            self.release(venv_path)
+
+    def list_venvs(self) -> List[VenvInfo]:
+        """Cached venvs, least recently used first"""
+        venvs = []
+        for path in self.cache_dir.iterdir():
+            if path.name.startswith('.') or not self._is_complete(path):
+                continue
+            marker = path / COMPLETE_MARKER
+            try:
+                last_used = marker.stat().st_mtime
+                with open(marker) as f:
+                    size = json.load(f)['size']
+            except (OSError, ValueError, KeyError, TypeError):
+                # Venvs built before sizes were recorded
+                size = _dir_size(path)
+                last_used = path.stat().st_mtime
+            venvs.append(VenvInfo(path, size, last_used))
+        venvs.sort(key=lambda venv: venv.last_used)
+        return venvs
+
+    def prune(
+        self,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        min_idle: float = 60.0,
+        dry_run: bool = False,
+        code_max_age: Optional[float] = CODE_MAX_AGE,
+    ) -> List[VenvInfo]:
+        """Evict least recently used venvs until the cache fits its limits
+
+        Limits default to the ones the manager was created with. Venvs held
+        by any process, being rebuilt, or used within ``min_idle`` seconds
+        are never evicted. Compiled task code unused for ``code_max_age``
+        seconds is deleted as well, unless that is None. Returns the evicted
+        (or, with ``dry_run``, the would-be evicted) venvs.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_entries = self.max_entries if max_entries is None else max_entries
+        self._remove_stale_builds()
+        if code_max_age is not None:
+            removed = self.code_cache.prune(
+                max(code_max_age, min_idle), dry_run)
+            logger.debug("Pruned %d compiled code file(s)", len(removed))
+
+        venvs = self.list_venvs()
+        total = sum(venv.size for venv in venvs)
+        count = len(venvs)
+        cutoff = time.time() - min_idle
+        evicted = []
+
+        for venv in venvs:
+            over_bytes = max_bytes is not None and total > max_bytes
+            over_entries = max_entries is not None and count > max_entries
+            if not (over_bytes or over_entries):
+                break
+            if venv.last_used > cutoff or venv.path in self._holds:
+                continue
+            if not dry_run and not self._evict(venv):
+                continue
+            logger.debug("Evicted virtual environment %s (%d bytes)",
+                         venv.env_hash, venv.size)
+            evicted.append(venv)
+            total -= venv.size
+            count -= 1
+        return evicted
+
+    def _evict(self, venv: VenvInfo) -> bool:
+        build_lock = FileLock(self._lock_path(venv.path))
+        use_lock = FileLock(self._use_lock_path(venv.path))
+        if not build_lock.acquire(blocking=False):
+            return False
+        try:
+            if not use_lock.acquire(blocking=False):
+                return False
+            try:
+                # Unpublish atomically, then delete outside the locks
+                trash = Path(tempfile.mkdtemp(
+                    prefix=f'.{venv.env_hash}-trash-', dir=self.cache_dir))
+                os.rename(venv.path, trash / venv.env_hash)
+            finally:
+                use_lock.release()
+        finally:
+            build_lock.release()
+        shutil.rmtree(trash, ignore_errors=True)
+        return True
+
+    def _remove_stale_builds(self) -> None:
+        """Delete temp directories left behind by crashed builders"""
+        for path in self.cache_dir.glob('.*-*'):
+            env_hash = path.name[1:].split('-', 1)[0]
+            lock = FileLock(self._lock_path(self.cache_dir / env_hash))
+            if lock.acquire(blocking=False):
+                try:
+                    shutil.rmtree(path, ignore_errors=True)
+                finally:
+                    lock.release()
+
+    def _thread_lock(self, venv_path: Path) -> threading.Lock:
+        with self._locks_guard:
+            return self._build_locks.setdefault(
+                str(venv_path), threading.Lock())
+
+    def _artifact_name(self, venv_path: Path) -> str:
+        # Layers and venvs of the same requirements differ in content
+        prefix = 'layer-' if venv_path.parent == self.layers_dir else ''
+        return f'{prefix}{venv_path.name}-{platform_tag()}{ARTIFACT_SUFFIX}'
+
+    def _fetch_artifact(self, venv_path: Path) -> bool:
+        """Install a venv from the artifact store; caller holds its locks"""
+        if self.artifact_store is None:
+            return False
+        scratch = Path(tempfile.mkdtemp(
+            prefix=f'.{venv_path.name}-', dir=venv_path.parent))
+        try:
+            archive = scratch / 'venv.tar.gz'
+            if not self.artifact_store.fetch(
+                    self._artifact_name(venv_path), archive):
+                return False
+            logger.debug("Fetched prebuilt virtual environment %s",
+                         venv_path.name)
+            self._unpack_venv(archive, venv_path)
+            return True
+        except (OSError, ValueError, RuntimeError, tarfile.TarError) as e:
+            logger.warning("Could not use prebuilt venv %s: %s",
+                           venv_path.name, e)
+            return False
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def _publish_artifact(self, venv_path: Path) -> None:
+        if self.artifact_store is None:
+            return
+        scratch = Path(tempfile.mkdtemp(
+            prefix=f'.{venv_path.name}-', dir=venv_path.parent))
+        try:
+            archive = scratch / 'venv.tar.gz'
+            pack_venv(venv_path, archive, exclude=COMPLETE_MARKER)
+            self.artifact_store.publish(self._artifact_name(venv_path), archive)
+        except OSError as e:
+            # Other nodes will just build the venv themselves
+            logger.warning("Could not publish venv %s: %s", venv_path.name, e)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    def export_venv(self, env_hash: str, archive_path: Path) -> Path:
+        """Write a cached venv to a relocatable archive"""
+        venv_path = self.cache_dir / env_hash
+        if not self._is_complete(venv_path):
+            raise ValueError(f"No cached virtual environment {env_hash}")
+        with self.using(venv_path):
+            pack_venv(venv_path, archive_path, exclude=COMPLETE_MARKER)
+        return archive_path
+
+    def import_venv(self, archive_path: Path) -> Path:
+        """Install a venv archived by export_venv() into the cache"""
+        env_hash = read_metadata(archive_path).get('env_hash')
+        # It names a directory in the cache, so it must be a real hash
+        if not isinstance(env_hash, str) or not ENV_HASH.fullmatch(env_hash):
+            raise ValueError(
+                f"{archive_path} has an invalid env hash: {env_hash!r}")
+        venv_path = self.cache_dir / env_hash
+        with self._thread_lock(venv_path), FileLock(self._lock_path(venv_path)):
+            if not self._is_complete(venv_path):
+                self._unpack_venv(archive_path, venv_path)
         return venv_path
 
-    def _install_packages(self, venv_path: Path, requirements: List[str]) -> None:
-        """Install Python packages in the specified virtual environment"""
-        pip_path = self._get_pip_path(venv_path)
-        print(f"Installing packages: {requirements}")
+    def _unpack_venv(self, archive_path: Path, venv_path: Path) -> None:
+        """Extract, relocate and publish an archived venv; caller holds locks"""
+        build_path = Path(tempfile.mkdtemp(
+            prefix=f'.{venv_path.name}-', dir=venv_path.parent))
+        try:
+            metadata = unpack_venv(archive_path, build_path)
+            self._relocate_venv(
+                build_path, venv_path, old_path=Path(metadata['path']))
+            self._fetch_linked_layers(build_path)
+            with open(build_path / COMPLETE_MARKER, 'w') as f:
+                json.dump({'size': _dir_size(build_path)}, f)
+            if venv_path.exists():
+                shutil.rmtree(venv_path)
+            os.rename(build_path, venv_path)
+        except BaseException:
+            shutil.rmtree(build_path, ignore_errors=True)
+            raise
 
+    def _fetch_linked_layers(self, venv_path: Path) -> None:
+        """Make sure the base layers an imported venv links to exist here"""
+        site_packages = self._get_site_packages(venv_path)
+        try:
+            lines = (site_packages / LAYERS_PTH).read_text().split()
+        except OSError:
+            return
+        for line in lines:
+            layer_site = Path(os.path.normpath(site_packages / line))
+            layer_path = self.layers_dir / layer_site.relative_to(
+                self.layers_dir).parts[0]
+            with self._thread_lock(layer_path), \
+                    FileLock(self._lock_path(layer_path)):
+                if not self._is_complete(layer_path) and \
+                        not self._fetch_artifact(layer_path):
+                    raise RuntimeError(
+                        f"Base layer {layer_path.name} is not available")
+
+    def _relocate_venv(
+        self, venv_path: Path, target_path: Path,
+        old_path: Optional[Path] = None,
+    ) -> None:
+        """Rewrite absolute paths in venv scripts before the venv is moved
+
+        The interpreter itself finds its venv through pyvenv.cfg, but
+        console-script shebangs and activation scripts embed the location.
+        ``old_path`` is the location embedded in the scripts, if it isn't
+        venv_path.
+        """
+        old = str(old_path or venv_path).encode()
+        new = str(target_path).encode()
+        for script in self._get_python_path(venv_path).parent.iterdir():
+            if script.is_symlink() or not script.is_file():
+                continue
+            if script.suffix == '.exe':
+                continue  # Windows launchers can't be rewritten in place
+            try:
+                content = script.read_bytes()
+            except OSError:
+                continue
+            if old in content:
+                script.write_bytes(content.replace(old, new))
+
+    def get_venv_packages(self, venv_path: Path) -> List[str]:
+        """Names of the packages installed into a cached venv"""
+        try:
+            with open(venv_path / 'dependencies.json') as f:
+                dependencies = json.load(f)
+        except (OSError, ValueError):
+            return []
+        python_deps = dependencies.get('python') or {}
+        return [pkg['name'] for pkg in python_deps.get('packages') or []]
+
+    def _lockfile_path(self, venv_path: Path) -> Path:
+        return venv_path.parent / '.lockfiles' / f'{venv_path.name}.txt'
+
+    def _install_locked(self, venv_path: Path, lockfile: Path) -> bool:
+        """Install a recorded lockfile from the wheelhouse, if there is one
+
+        Returns False when the venv still needs a full install.
+        """
+        try:
+            pins = lockfile.read_text().split()
+        except OSError:
+            return False
+        try:
+            if pins:
+                self._install_from_wheelhouse(venv_path, pins)
+        except RuntimeError:
+            if self.offline:
+                raise
+            logger.debug("Wheelhouse is missing locked packages, "
+                         "falling back to a full install")
+            return False
+        return True
+
+    def _install_packages(
+        self, venv_path: Path, requirements: List[str]
+    ) -> List[str]:
+        """Install Python packages in the specified virtual environment
+
+        Resolves the requirements, saves wheels for everything that needs
+        installing into the wheelhouse and installs them from there.
+        Returns the pinned ``name==version`` requirements installed.
+        """
+        logger.debug("Installing packages: %s", requirements)
+        # Resolve with the venv's own pip so packages provided by linked
+        # base layers are left out
+        report = json.loads(self._run_pip(
+            venv_path, ['install', '--dry-run', '--quiet', '--report', '-']
+            + self._index_options() + requirements))
+        pins = sorted(
+            f"{item['metadata']['name']}=={item['metadata']['version']}"
+            for item in report['install']
+        )
+        if pins:
+            self.wheelhouse.mkdir(parents=True, exist_ok=True)
+            self._run_pip(
+                venv_path, ['wheel', '--no-deps', '--quiet', '--wheel-dir',
+                            str(self.wheelhouse)] + self._index_options() + pins)
+            self._install_from_wheelhouse(venv_path, pins)
+        logger.debug("Package installation successful")
+        return pins
+
+    def _install_from_wheelhouse(self, venv_path: Path, pins: List[str]) -> None:
+        """Install exact pins from local wheels, without resolving"""
+        logger.debug("Installing from wheelhouse: %s", pins)
+        self._run_pip(
+            venv_path, ['install', '--no-index', '--no-deps', '--find-links',
+                        str(self.wheelhouse)] + pins)
+
+    def _index_options(self) -> List[str]:
+        options = ['--find-links', str(self.wheelhouse)]
+        if self.offline:
+            options.append('--no-index')
+        return options
+
+    def _run_pip(self, venv_path: Path, args: List[str]) -> str:
+        pip_path = self._get_pip_path(venv_path)
         try:
             process = subprocess.run(
-                [str(pip_path), 'install'] + requirements,
+                [str(pip_path)] + args,
                 capture_output=True,
                 text=True,
                 check=True
             )
-            print("Package installation successful")
         except subprocess.CalledProcessError as e:
-            print(f"Package installation failed: {e.stderr}")
+            logger.debug("Package installation failed: %s", e.stderr)
             raise RuntimeError(f"Failed to install dependencies: {e.stderr}")
+        return process.stdout
 
     def _get_pip_path(self, venv_path: Path) -> Path:
         """Get path to pip executable in venv"""
@@ -92,35 +748,364 @@ class DependencyManager:
         current_version = version.parse(sys.version.split()[0])
         spec = SpecifierSet(version_spec)
 
-        print(
-            f"Checking Python version: {current_version} against {version_spec}")
+        logger.debug("Checking Python version: %s against %s",
+                     current_version, version_spec)
 
         if current_version not in spec:
             raise RuntimeError(
                 f"Python version {current_version} does not meet requirement: {version_spec}")
 
-        print("Python version check passed")
+        logger.debug("Python version check passed")
 
-    def execute_in_venv(self, script: str, dependencies: Dict) -> str:
-        """Execute a script in a cached virtual environment"""
-        venv_path = self._get_cached_venv(dependencies)
+    def execute_in_venv(
+        self,
+        script: str,
+        dependencies: Dict,
+        limits: Optional[ResourceLimits] = None,
+    ) -> str:
+        """Execute a script in a cached virtual environment
+
+        ``limits`` bound the run's wall-clock time, CPU time and address
+        space; output size limits only apply to the async methods.
+        """
+        venv_path = self._get_cached_venv(dependencies, hold=True)
+        try:
+            return self._execute_script(venv_path, script, limits)
+        finally:
+            self.release(venv_path)
+
+    def _execute_script(
+        self,
+        venv_path: Path,
+        script: str,
+        limits: Optional[ResourceLimits],
+    ) -> str:
         python_path = self._get_python_path(venv_path)
 
-        print(f"Executing script with Python at: {python_path}")
+        logger.debug("Executing script with Python at: %s", python_path)
 
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp:
+        with tempfile.NamedTemporaryFile(
+                mode='w', suffix='.py', delete=False) as tmp:
             tmp.write(script)
             tmp.flush()
 
             try:
-                process = subprocess.run(
+                process = subprocess.Popen(
                     [str(python_path), tmp.name],
-                    capture_output=True,
-                    text=True
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    **spawn_options(limits),
                 )
+                try:
+                    stdout, stderr = process.communicate(
+                        timeout=limits.timeout if limits else None)
+                except BaseException as e:
+                    kill_process_tree(process)
+                    process.communicate()
+                    if isinstance(e, subprocess.TimeoutExpired):
+                        raise TaskTimeout(
+                            f"Task timed out after {limits.timeout} seconds")
+                    raise
                 if process.returncode != 0:
-                    raise RuntimeError(
-                        f"Script execution failed: {process.stderr}")
-                return process.stdout
+                    raise exit_error(process.returncode, stderr)
+                return stdout
             finally:
                 os.unlink(tmp.name)
+
+    async def get_cached_venv_async(self, dependencies: Dict) -> Path:
+        """Get or create a cached venv without blocking the event loop
+
+        The venv is returned already held, so it can't be evicted before
+        the caller uses it; release() it when done.
+        """
+        env_hash = self._get_env_hash(dependencies)
+        resolved = dependencies
+        if self.resolve_pins:
+            # Resolving may run pip; only take the fast path if it's cached
+            resolved = self._resolved.get(env_hash)
+        if resolved is not None:
+            venv_path = self.cache_dir / self._get_env_hash(resolved)
+            if self._is_complete(venv_path) and self._hold_if_complete(venv_path):
+                return venv_path
+        while True:
+            # Coroutines needing the same venv share one builder thread
+            venv_path = await self._building.do(
+                env_hash,
+                lambda: asyncio.to_thread(self._get_cached_venv, dependencies),
+            )
+            # Evicted between the build and now only under heavy pruning
+            if self._hold_if_complete(venv_path):
+                return venv_path
+
+    async def execute_in_venv_async(
+        self,
+        script: str,
+        dependencies: Dict,
+        limits: Optional[ResourceLimits] = None,
+    ) -> str:
+        """Execute a script in a cached virtual environment asynchronously"""
+        venv_path = await self.get_cached_venv_async(dependencies)
+        try:
+            return await self.run_script_async(script, venv_path, limits)
+        finally:
+            self.release(venv_path)
+
+    async def run_script_async(
+        self,
+        script: str,
+        venv_path: Path,
+        limits: Optional[ResourceLimits] = None,
+    ) -> str:
+        """Run a script with the interpreter of an existing venv"""
+        script_path = await asyncio.to_thread(_write_script, script)
+        try:
+            return await self.run_python_async(
+                venv_path, [script_path], limits=limits)
+        finally:
+            os.unlink(script_path)
+
+    async def run_python_async(
+        self,
+        venv_path: Path,
+        args: List[str],
+        stdin: Optional[bytes] = None,
+        limits: Optional[ResourceLimits] = None,
+        rlimits: bool = True,
+    ) -> str:
+        """Run the venv interpreter with arguments and return its stdout
+
+        Pass ``rlimits=False`` if the child applies the CPU and memory
+        ``limits`` itself (see limits.spawn_options()).
+        """
+        stdout, _ = await self._communicate(
+            venv_path, args, stdin, limits, rlimits)
+        return stdout
+
+    async def _communicate(
+        self,
+        venv_path: Path,
+        args: List[str],
+        stdin: Optional[bytes] = None,
+        limits: Optional[ResourceLimits] = None,
+        rlimits: bool = True,
+    ) -> Tuple[str, str]:
+        """Run the venv interpreter and return its stdout and stderr
+
+        The child runs in its own process group under ``limits``. Timing
+        out, overrunning the output limit or cancelling the caller kills
+        the child together with anything it started.
+        """
+        python_path = self._get_python_path(venv_path)
+        limits = limits or ResourceLimits()
+
+        logger.debug("Executing script with Python at: %s", python_path)
+
+        process = await asyncio.create_subprocess_exec(
+            str(python_path), *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **spawn_options(limits, rlimits),
+        )
+        try:
+            stdout, stderr = await Deadline(limits.timeout).wait(
+                _collect(process, stdin, limits.max_output_bytes))
+        except BaseException:
+            # Don't leave the child running when the caller gives up
+            kill_process_tree(process)
+            await process.wait()
+            raise
+
+        if process.returncode != 0:
+            raise exit_error(
+                process.returncode, stderr.decode(errors='replace'))
+        return stdout.decode(), stderr.decode(errors='replace')
+
+    async def stream_python_async(
+        self,
+        venv_path: Path,
+        args: List[str],
+        stdin: Optional[bytes] = None,
+        *,
+        max_line_bytes: int = 1024 * 1024,
+        stderr_spill_bytes: int = 1024 * 1024,
+        limits: Optional[ResourceLimits] = None,
+        rlimits: bool = True,
+    ) -> AsyncIterator[bytes]:
+        """Run the venv interpreter and yield its stdout line by line
+
+        At most about ``2 * max_line_bytes`` of output is buffered: when the
+        consumer falls behind, the child blocks on its next write. stderr is
+        drained in the background and spills to a temp file beyond
+        ``stderr_spill_bytes``. Closing the iterator early kills the child
+        and anything it started. The ``limits`` timeout covers the whole
+        stream, including time the consumer spends between records, and
+        ``max_output_bytes`` caps the total stdout yielded. ``rlimits`` is
+        as for run_python_async().
+        """
+        python_path = self._get_python_path(venv_path)
+        limits = limits or ResourceLimits()
+        logger.debug("Streaming script with Python at: %s", python_path)
+
+        process = await asyncio.create_subprocess_exec(
+            str(python_path), *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else None,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=max_line_bytes,
+            **spawn_options(limits, rlimits),
+        )
+        deadline = Deadline(limits.timeout)
+        written = 0
+        stderr = tempfile.SpooledTemporaryFile(max_size=stderr_spill_bytes)
+        draining = asyncio.ensure_future(_drain(process.stderr, stderr))
+        try:
+            if stdin is not None:
+                process.stdin.write(stdin)
+                await deadline.wait(process.stdin.drain())
+                process.stdin.close()
+            while True:
+                try:
+                    line = await deadline.wait(
+                        process.stdout.readuntil(b'\n'))
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial
+                except asyncio.LimitOverrunError:
+                    raise ValueError(
+                        f"Output line exceeds {max_line_bytes} bytes")
+                if not line:
+                    break
+                written += len(line)
+                if (
+                    limits.max_output_bytes is not None
+                    and written > limits.max_output_bytes
+                ):
+                    raise OutputLimitExceeded(
+                        f"Task output exceeded {limits.max_output_bytes} bytes")
+                yield line
+
+            await deadline.wait(draining)
+            if await deadline.wait(process.wait()) != 0:
+                raise exit_error(process.returncode, _tail(stderr))
+        finally:
+            if process.returncode is None:
+                kill_process_tree(process)
+                await process.wait()
+            draining.cancel()
+            stderr.close()
+
+
+async def _collect(
+    process: asyncio.subprocess.Process,
+    stdin: Optional[bytes],
+    max_output_bytes: Optional[int],
+) -> Tuple[bytes, bytes]:
+    """Like process.communicate(), but enforcing an output limit"""
+    if max_output_bytes is None:
+        return await process.communicate(stdin)
+
+    async def feed() -> None:
+        if stdin is None:
+            return
+        try:
+            process.stdin.write(stdin)
+            await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The child exited without reading all of its input
+
+    stdout, stderr, _ = await asyncio.gather(
+        read_limited(process.stdout, max_output_bytes),
+        read_limited(process.stderr, max_output_bytes),
+        feed(),
+    )
+    await process.wait()
+    return stdout, stderr
+
+
+async def _drain(stream: asyncio.StreamReader, sink) -> None:
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return
+        sink.write(chunk)
+
+
+def _tail(spool, limit: int = 64 * 1024) -> str:
+    """The last ``limit`` bytes written to a spooled file, as text"""
+    size = spool.tell()
+    spool.seek(max(size - limit, 0))
+    prefix = '...' if size > limit else ''
+    return prefix + spool.read().decode(errors='replace')
+
+
+def _write_script(script: str) -> str:
+    """Write a script to a temporary file and return its path"""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp:
+        tmp.write(script)
+    return tmp.name
+
+
+def canonicalize_specifier(spec: Optional[str]) -> str:
+    """Normalize a version specifier, e.g. '<3, >=2.0' -> '<3,>=2.0'"""
+    if not spec:
+        return ''
+    try:
+        return ','.join(sorted(str(s) for s in SpecifierSet(spec)))
+    except InvalidSpecifier:
+        return ''.join(spec.split())
+
+
+def canonicalize_dependencies(dependencies: Dict) -> Dict:
+    """Normalize a dependencies dict so equivalent specs compare equal
+
+    Package names are canonicalized (``Pandas`` -> ``pandas``), specifier
+    sets are normalized and merged per package, and packages are sorted.
+    """
+    canonical = dict(dependencies)
+    python_deps = dependencies.get('python')
+    if not python_deps:
+        canonical.pop('python', None)
+        return canonical
+
+    specifiers: Dict[str, List[str]] = {}
+    for pkg in python_deps.get('packages') or []:
+        name = canonicalize_name(pkg['name'])
+        specifiers.setdefault(name, []).append(pkg.get('version') or '')
+    packages = [
+        {'name': name, 'version': canonicalize_specifier(','.join(
+            spec for spec in specs if spec.strip()))}
+        for name, specs in sorted(specifiers.items())
+    ]
+
+    canonical['python'] = {
+        'packages': packages,
+        'version': canonicalize_specifier(python_deps.get('version')) or None,
+    }
+    return canonical
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    """Replace a file so that readers never see partial content"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def _dir_size(path: Path) -> int:
+    """Total size of the files under a directory, not following symlinks"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
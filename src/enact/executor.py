@@ -1,44 +1,326 @@
-from enact.dependency_manager import DependencyManager
 import json
-from typing import Any, Dict
-from .models import EnactTask
-from .dependency_manager import DependencyManager  # New import
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Union
+from .backends import (
+    ExecutionBackend, build_script, create_backend, run_profiled,
+    stream_in_runner,
+)
+from .cache import ResultCache
+from .flow import run_flow
+from .limits import Deadline, ResourceLimitExceeded
+from .metrics import Instrumentation, Timings, measure, recording
+from .models import EnactTask, ResourceLimits, Task
+from .outputs import (
+    TaskOutput, as_task_output, contains_artifacts, resolve_artifacts,
+)
+from .profiling import TaskProfile
+from .dependency_manager import DependencyManager, canonicalize_dependencies
+
+logger = logging.getLogger(__name__)
 
 
 class TaskExecutor:
-    def __init__(self):
-        self.dependency_manager = DependencyManager()
+    """Runs tasks on an execution backend
+
+    ``limits`` are the default ResourceLimits for every run. A task's own
+    limits can only tighten them, while limits passed to a single call
+    override both.
+    """
+
+    def __init__(
+        self,
+        backend: Union[str, ExecutionBackend] = "subprocess",
+        dependency_manager: Optional[DependencyManager] = None,
+        result_cache: Optional[ResultCache] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        limits: Optional[ResourceLimits] = None,
+    ):
+        self.dependency_manager = dependency_manager or DependencyManager()
+        self.result_cache = result_cache
+        self.instrumentation = instrumentation
+        self.limits = limits
+        if isinstance(backend, str):
+            backend = create_backend(backend, self.dependency_manager)
+        self.backend = backend
 
     def create_script(self, task: EnactTask, inputs: Dict[str, Any]) -> str:
+        return build_script(self._python_task(task).code, inputs)
+
+    def execute_locally(
+        self,
+        task: EnactTask,
+        script: str,
+        limits: Optional[ResourceLimits] = None,
+    ) -> Dict[str, Any]:
+        """Execute a task with its dependencies"""
+        try:
+            output = self.dependency_manager.execute_in_venv(
+                script, self._dependencies(task), self._limits(task, limits))
+            return self._parse_output(output)
+        except ResourceLimitExceeded:
+            raise
+        except Exception as e:
+            logger.debug("Task %s failed: %s", task.id, e)
+            raise RuntimeError(f"Task execution failed: {str(e)}")
+
+    async def execute_locally_async(
+        self,
+        task: EnactTask,
+        script: str,
+        venv_path: Optional[Path] = None,
+        limits: Optional[ResourceLimits] = None,
+    ) -> Dict[str, Any]:
+        """Execute a task with its dependencies without blocking the loop"""
+        try:
+            async with self._venv(task, venv_path, fresh=True) as venv_path:
+                output = await self.dependency_manager.run_script_async(
+                    script, venv_path, self._limits(task, limits))
+            return self._parse_output(output)
+        except ResourceLimitExceeded:
+            raise
+        except Exception as e:
+            logger.debug("Task %s failed: %s", task.id, e)
+            raise RuntimeError(f"Task execution failed: {str(e)}")
+
+    async def run(
+        self,
+        task: EnactTask,
+        inputs: Dict[str, Any],
+        venv_path: Optional[Path] = None,
+        timings: Optional[Timings] = None,
+        profile: Optional[TaskProfile] = None,
+        limits: Optional[ResourceLimits] = None,
+    ) -> Dict[str, Any]:
+        """Execute a task with the configured execution backend
+
+        Pass a Timings object to receive the per-phase breakdown of this run.
+        Passing a TaskProfile runs the task under cProfile in a fresh
+        interpreter, whatever the backend, and stores the profile in it.
+        A run that breaks its limits raises a ResourceLimitExceeded, such as
+        TaskTimeout; the timeout does not include building the venv.
+        """
+        with recording(self.instrumentation, timings, task.id):
+            return await self._run(
+                task, inputs, venv_path, profile, self._limits(task, limits))
+
+    async def _run(
+        self,
+        task: EnactTask,
+        inputs: Dict[str, Any],
+        venv_path: Optional[Path],
+        profile: Optional[TaskProfile],
+        limits: Optional[ResourceLimits],
+    ) -> Dict[str, Any]:
+        try:
+            if task.type == "composite":
+                if profile is not None:
+                    raise ValueError("Composite tasks can't be profiled")
+                code = "\0".join(t.code for t in task.tasks)
+            else:
+                code = self._python_task(task).code
+            await self._compile(task)
+            # A profiled run has to actually run
+            cache_key = None
+            if profile is None:
+                cache_key = self._result_key(task, code, inputs)
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            # Profiled runs always get a fresh interpreter
+            fresh = profile is not None
+            async with self._venv(task, venv_path, fresh) as venv_path:
+                deadline = Deadline(limits.timeout if limits else None)
+                if task.type == "composite":
+                    result = await deadline.wait(
+                        run_flow(self, task, inputs, venv_path, limits))
+                    if contains_artifacts(result):
+                        # Step artifacts are per run, like a single task's
+                        cache_key = None
+                else:
+                    if profile is not None:
+                        output = await deadline.wait(run_profiled(
+                            self.dependency_manager, venv_path, code, inputs,
+                            profile, self.backend.new_artifacts_dir(),
+                            limits))
+                    else:
+                        output = await deadline.wait(self._run_code(
+                            venv_path, code, inputs, limits))
+                    output = as_task_output(output)
+                    result = self._parse_output(output)
+                    if output.has_artifacts:
+                        # The files belong to the caller and may be deleted
+                        cache_key = None
+
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result)
+            return result
+        except ResourceLimitExceeded as e:
+            logger.debug("Task %s stopped: %s", task.id, e)
+            raise
+        except Exception as e:
+            logger.debug("Task %s failed: %s", task.id, e)
+            raise RuntimeError(f"Task execution failed: {str(e)}")
+
+    async def stream(
+        self,
+        task: EnactTask,
+        inputs: Dict[str, Any],
+        venv_path: Optional[Path] = None,
+        *,
+        max_record_bytes: int = 1024 * 1024,
+        stderr_spill_bytes: int = 1024 * 1024,
+        limits: Optional[ResourceLimits] = None,
+    ) -> AsyncIterator[Any]:
+        """Run a task in a fresh interpreter and yield the records it prints
+
+        Each line the task writes to stdout (e.g. with ``emit()``) is parsed
+        as one JSON record. See DependencyManager.stream_python_async() for
+        the buffering limits. ``aclose()`` stops the task.
+        """
+        if task.type == "composite":
+            raise ValueError("Composite tasks can't be streamed")
+        code = self._python_task(task).code
+        await self._compile(task)
+        input_encoding = getattr(self.backend, "input_encoding", "json")
+
+        async with self._venv(task, venv_path, fresh=True) as venv_path:
+            lines = stream_in_runner(
+                self.dependency_manager, venv_path, code, inputs,
+                input_encoding, max_line_bytes=max_record_bytes,
+                stderr_spill_bytes=stderr_spill_bytes,
+                limits=self._limits(task, limits))
+            try:
+                async for line in lines:
+                    if line.strip():
+                        yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(
+                    f"Failed to parse output record as JSON: {e.doc!r}")
+            finally:
+                await lines.aclose()
+
+    async def prepare(self, task: EnactTask) -> Optional[Path]:
+        """Resolve (building if needed) the venv a task runs in
+
+        The task code is compiled first, so syntax errors are raised before
+        anything is built. The venv is returned held against eviction;
+        release it with ``dependency_manager.release()`` when done.
+        Backends that run tasks in this interpreter need no venv; for them
+        this only checks that the task can run here and returns None.
+        """
+        await self._compile(task)
+        if not self.backend.requires_venv:
+            self._check_in_process(task)
+            return None
+        return await self._get_venv(task)
+
+    async def _get_venv(self, task: EnactTask) -> Path:
+        with measure("venv"):
+            return await self.dependency_manager.get_cached_venv_async(
+                self._dependencies(task))
+
+    async def _compile(self, task: EnactTask) -> None:
+        # Compiled once per code; runs load the cached code objects
+        for python_task in task.tasks:
+            if python_task.language == "python":
+                await self.dependency_manager.code_cache.compile_async(
+                    python_task.code)
+
+    def _check_in_process(self, task: EnactTask) -> None:
+        dependencies = canonicalize_dependencies(self._dependencies(task))
+        python_deps = dependencies.get('python') or {}
+        if python_deps.get('packages'):
+            raise ValueError(
+                f"Task {task.id} declares dependencies and can't run "
+                "in-process")
+        if python_deps.get('version'):
+            self.dependency_manager._check_python_version(
+                python_deps['version'])
+
+    @asynccontextmanager
+    async def _venv(
+        self, task: EnactTask, venv_path: Optional[Path], fresh: bool = False
+    ) -> AsyncIterator[Optional[Path]]:
+        """The venv a run uses, held for the block
+
+        None for in-process backends, unless the run needs a ``fresh``
+        interpreter anyway.
+        """
+        if venv_path is not None:
+            with self.dependency_manager.using(venv_path):
+                yield venv_path
+            return
+        if fresh:
+            venv_path = await self._get_venv(task)
+        else:
+            venv_path = await self.prepare(task)
+        try:
+            yield venv_path
+        finally:
+            if venv_path is not None:
+                self.dependency_manager.release(venv_path)
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    async def _run_code(
+        self,
+        venv_path: Optional[Path],
+        code: str,
+        inputs: Dict[str, Any],
+        limits: Optional[ResourceLimits],
+    ) -> Union[str, TaskOutput]:
+        if limits is None:
+            # Backends written before limits existed don't take them
+            return await self.backend.run(venv_path, code, inputs)
+        return await self.backend.run(venv_path, code, inputs, limits=limits)
+
+    def _limits(
+        self, task: EnactTask, limits: Optional[ResourceLimits]
+    ) -> Optional[ResourceLimits]:
+        effective = self.limits
+        if task.limits is not None:
+            effective = task.limits.tighten(self.limits)
+        if limits is not None:
+            effective = (effective or ResourceLimits()).override(limits)
+        return effective
+
+    def _python_task(self, task: EnactTask) -> Task:
         python_task = next(
             (t for t in task.tasks if t.language == "python"),
             None
         )
         if not python_task:
             raise ValueError("No Python task found in Enact definition")
+        return python_task
 
-        return f"""import json
-
-# Input values
-inputs = {json.dumps(inputs, indent=2)}
+    def _result_key(
+        self, task: EnactTask, code: str, inputs: Dict[str, Any]
+    ) -> Optional[str]:
+        if self.result_cache is None or not task.cacheable:
+            return None
+        dependency_hash = self.dependency_manager._get_env_hash(
+            self._dependencies(task))
+        return self.result_cache.make_key(task, code, dependency_hash, inputs)
 
-# Main task code
-{python_task.code}"""
-
-    def execute_locally(self, task: EnactTask, script: str) -> Dict[str, Any]:
-        """Execute a task with its dependencies"""
-        try:
-            # Get dependencies
-            dependencies = task.dependencies.model_dump() if task.dependencies else {}
-
-            # Execute in managed environment
-            output = self.dependency_manager.execute_in_venv(
-                script, dependencies)
+    def _dependencies(self, task: EnactTask) -> Dict[str, Any]:
+        return task.dependencies.model_dump() if task.dependencies else {}
 
+    def _parse_output(self, output: Union[str, TaskOutput]) -> Dict[str, Any]:
+        output = as_task_output(output)
+        if output.has_result:
+            result = output.result
+        else:
             try:
-                return json.loads(output.strip())
+                with measure("parse", len(output.stdout)):
+                    result = json.loads(output.stdout.strip())
             except json.JSONDecodeError:
-                raise ValueError(f"Failed to parse output as JSON: {output}")
-
-        except Exception as e:
-            raise RuntimeError(f"Task execution failed: {str(e)}")
+                raise ValueError(
+                    f"Failed to parse output as JSON: {output.stdout}")
+        if output.has_artifacts:
+            result = resolve_artifacts(result)
+        return result
@@ -0,0 +1,147 @@
+# src/enact/flow.py
+import asyncio
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .models import EnactTask, FlowStep, ResourceLimits, Task
+
+if TYPE_CHECKING:
+    from .executor import TaskExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class FlowNode:
+    """A flow step resolved against its task and dependencies"""
+
+    def __init__(self, step: FlowStep, task: Task, depends_on: List[str]):
+        self.step = step
+        self.task = task
+        self.depends_on = depends_on
+
+    @property
+    def id(self) -> str:
+        return self.step.step_id
+
+
+def build_graph(task: EnactTask) -> Dict[str, FlowNode]:
+    """Turn ``flow.steps`` into a validated dependency graph
+
+    A step without ``depends_on`` depends on the step listed before it, so
+    plain step lists keep running in order; list dependencies explicitly
+    (``depends_on: []`` for none) to let steps run in parallel.
+    """
+    tasks = {t.id: t for t in task.tasks}
+    nodes: Dict[str, FlowNode] = {}
+    previous = None
+    for step in task.flow.steps:
+        if step.step_id in nodes:
+            raise ValueError(f"Duplicate flow step id: {step.step_id}")
+        if step.task not in tasks:
+            raise ValueError(
+                f"Flow step {step.step_id} references unknown task {step.task}")
+        if tasks[step.task].language != "python":
+            raise ValueError(
+                f"Flow step {step.step_id} is not a Python task")
+        if step.depends_on is not None:
+            depends_on = list(step.depends_on)
+        else:
+            depends_on = [previous] if previous else []
+        nodes[step.step_id] = FlowNode(step, tasks[step.task], depends_on)
+        previous = step.step_id
+
+    for node in nodes.values():
+        for dependency in node.depends_on:
+            if dependency not in nodes:
+                raise ValueError(
+                    f"Flow step {node.id} depends on unknown step {dependency}")
+    _check_acyclic(nodes)
+    return nodes
+
+
+def _check_acyclic(nodes: Dict[str, FlowNode]) -> None:
+    remaining = {node_id: len(node.depends_on) for node_id, node in nodes.items()}
+    ready = [node_id for node_id, count in remaining.items() if count == 0]
+    visited = 0
+    while ready:
+        node_id = ready.pop()
+        visited += 1
+        for other in nodes.values():
+            if node_id in other.depends_on:
+                remaining[other.id] -= 1
+                if remaining[other.id] == 0:
+                    ready.append(other.id)
+    if visited != len(nodes):
+        raise ValueError("Flow steps contain a dependency cycle")
+
+
+async def run_flow(
+    executor: "TaskExecutor",
+    task: EnactTask,
+    inputs: Dict[str, Any],
+    venv_path: Optional[Path],
+    limits: Optional[ResourceLimits] = None,
+) -> Dict[str, Any]:
+    """Run a composite task's steps concurrently in dependency order
+
+    Every step runs in the task's shared venv under the same ``limits``,
+    whose timeout the caller applies to the flow as a whole. A step
+    receives the flow's inputs plus ``inputs["steps"]``, the parsed outputs
+    of the steps it depends on, which are held in memory rather than
+    refetched. The result is the merged output of the steps nothing else
+    depends on, so those steps must output JSON objects.
+    """
+    nodes = build_graph(task)
+    if not nodes:
+        raise ValueError("Composite task has no flow steps")
+
+    outputs: Dict[str, Any] = {}
+    running: Dict["asyncio.Future", str] = {}
+
+    async def run_step(node: FlowNode) -> Dict[str, Any]:
+        step_inputs = dict(inputs)
+        step_inputs["steps"] = {d: outputs[d] for d in node.depends_on}
+        logger.debug("Running flow step %s", node.id)
+        output = await executor._run_code(
+            venv_path, node.task.code, step_inputs, limits)
+        return executor._parse_output(output)
+
+    def start_ready() -> None:
+        started = set(outputs) | set(running.values())
+        for node in nodes.values():
+            if node.id not in started and all(
+                d in outputs for d in node.depends_on
+            ):
+                running[asyncio.ensure_future(run_step(node))] = node.id
+
+    try:
+        start_ready()
+        while running:
+            done, _ = await asyncio.wait(
+                running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                node_id = running.pop(future)
+                try:
+                    outputs[node_id] = future.result()
+                except Exception as e:
+                    raise RuntimeError(
+                        f"Flow step {node_id} failed: {e}") from e
+            start_ready()
+    finally:
+        for future in running:
+            future.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    depended_on = {d for node in nodes.values() for d in node.depends_on}
+    result: Dict[str, Any] = {}
+    for node_id in nodes:
+        if node_id not in depended_on:
+            output = outputs[node_id]
+            if not isinstance(output, dict):
+                raise RuntimeError(
+                    f"Flow step {node_id} returned "
+                    f"{type(output).__name__}, but a final step must "
+                    "return a JSON object to merge into the result")
+            result.update(output)
+    return result
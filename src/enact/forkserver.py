@@ -0,0 +1,132 @@
+# src/enact/forkserver.py
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .limits import OutputLimitExceeded, exit_error, kill_process_group
+from .models import ResourceLimits
+from .outputs import TaskOutput, result_from_response
+from .worker_pool import HEADER
+
+logger = logging.getLogger(__name__)
+
+FORKSERVER_SCRIPT = Path(__file__).parent / '_forkserver.py'
+
+
+class ForkServer:
+    """A zygote interpreter that forks a fresh child for every execution
+
+    The zygote imports ``preload`` once at startup, so children start with
+    those modules already loaded but never share state with each other.
+    Only available on POSIX systems.
+    """
+
+    def __init__(self, python_path: Path, preload: List[str]):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Fork server execution requires os.fork()")
+        self.python_path = python_path
+        self.preload = preload
+        self.process = None
+        self._socket_dir = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    @property
+    def socket_path(self) -> Path:
+        return Path(self._socket_dir) / 'zygote.sock'
+
+    async def start(self) -> None:
+        self._socket_dir = tempfile.mkdtemp(prefix='enact-zygote-')
+        self.process = await asyncio.create_subprocess_exec(
+            str(self.python_path), str(FORKSERVER_SCRIPT),
+            str(self.socket_path), json.dumps(self.preload),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        ready = await self.process.stdout.readline()
+        if ready.strip() != b'ready':
+            await self.stop()
+            raise RuntimeError(
+                f"Fork server for {self.python_path} failed to start")
+        logger.debug("Started fork server %s for %s preloading %s",
+                     self.process.pid, self.python_path, self.preload)
+
+    async def run(
+        self,
+        code: str,
+        inputs: Dict[str, Any],
+        artifacts_dir: Optional[Path] = None,
+        limits: Optional[ResourceLimits] = None,
+        code_path: Optional[Path] = None,
+    ) -> TaskOutput:
+        """Run task code in a freshly forked child and return its output
+
+        The child applies the CPU and memory ``limits`` to itself and is
+        killed by an alarm if it outlives their timeout. It runs in its own
+        process group, which is killed if the run fails or is cancelled. It
+        loads the code compiled by a CodeCache from ``code_path`` if given.
+        """
+        reader, writer = await asyncio.open_unix_connection(
+            str(self.socket_path))
+        pid = None
+        try:
+            pid = (await _read_message(reader))['pid']
+            request = {'code': code, 'inputs': inputs}
+            if artifacts_dir is not None:
+                request['artifacts_dir'] = str(artifacts_dir)
+            if code_path is not None:
+                request['code_path'] = str(code_path)
+            if limits is not None:
+                request['limits'] = limits.model_dump(exclude_none=True)
+            payload = json.dumps(request).encode()
+            writer.write(HEADER.pack(len(payload)) + payload)
+            await writer.drain()
+            response = await _read_message(
+                reader, limits.max_output_bytes if limits else None)
+        except BaseException as e:
+            # Don't leave the child, or anything it started, running
+            if pid is not None:
+                kill_process_group(pid)
+            if artifacts_dir is not None:
+                shutil.rmtree(artifacts_dir, ignore_errors=True)
+            if isinstance(e, asyncio.IncompleteReadError):
+                raise RuntimeError("Forked child exited unexpectedly") from e
+            raise
+        finally:
+            writer.close()
+
+        return result_from_response(response, artifacts_dir)
+
+    async def stop(self) -> None:
+        if self.alive:
+            # Closing stdin makes the zygote exit; make sure of it anyway
+            self.process.stdin.close()
+            self.process.terminate()
+        if self.process is not None:
+            await self.process.wait()
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+
+async def _read_message(
+    reader: asyncio.StreamReader, max_bytes: Optional[int] = None
+) -> Dict[str, Any]:
+    (size,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if max_bytes is not None and size > max_bytes:
+        raise OutputLimitExceeded(f"Task output exceeded {max_bytes} bytes")
+    message = json.loads(await reader.readexactly(size))
+    if 'exit' in message:
+        # Sent by the zygote when the child was killed or exited early
+        code = message['exit']
+        raise exit_error(
+            code, f"Forked child exited unexpectedly with code {code}")
+    return message
@@ -0,0 +1,151 @@
+# src/enact/inprocess.py
+import asyncio
+import json
+import logging
+import shutil
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import CodeType
+from typing import Any, Dict, Optional
+
+from . import _worker
+from .outputs import TaskOutput, result_from_response
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+# The installed _ThreadStdout and how many runners use it
+_stdout_lock = threading.Lock()
+_stdout_proxy: Optional["_ThreadStdout"] = None
+_stdout_users = 0
+
+
+class _ThreadStdout:
+    """sys.stdout stand-in routing each task thread's output to its buffer
+
+    Threads not running a task write through to the stream it replaced.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def _target(self):
+        output = getattr(_local, 'output', None)
+        return output if output is not None else self.fallback
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+
+def _install_stdout() -> None:
+    """Route task threads' output through a _ThreadStdout while in use"""
+    global _stdout_proxy, _stdout_users
+    with _stdout_lock:
+        if _stdout_users == 0:
+            _stdout_proxy = _ThreadStdout(sys.stdout)
+            sys.stdout = _stdout_proxy
+        _stdout_users += 1
+
+
+def _uninstall_stdout() -> None:
+    global _stdout_proxy, _stdout_users
+    with _stdout_lock:
+        _stdout_users -= 1
+        if _stdout_users == 0:
+            # Unless the application has replaced it since
+            if sys.stdout is _stdout_proxy:
+                sys.stdout = _stdout_proxy.fallback
+            _stdout_proxy = None
+
+
+def run_task(
+    code: CodeType,
+    inputs: Dict[str, Any],
+    artifacts_dir: Optional[str] = None,
+    max_output_bytes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Run task code in this thread, returning a _worker.py response
+
+    Task output is only captured while an InProcessRunner has installed
+    the stdout proxy.
+    """
+    context = _worker.TaskContext(artifacts_dir)
+    # Decode fresh inputs so the task sees exactly what a child would
+    namespace = context.namespace(json.loads(json.dumps(inputs)))
+    output = _local.output = _worker.CappedOutput(max_output_bytes)
+    try:
+        exec(code, namespace)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            return {'ok': False, 'error': str(e.code)}
+    except _worker.OutputLimitReached as e:
+        return {'ok': False, 'error': str(e), 'limit': 'output'}
+    except Exception:
+        return {'ok': False, 'error': traceback.format_exc()}
+    finally:
+        _local.output = None
+
+    response = {'ok': True, 'stdout': output.getvalue()}
+    if context.result is not _worker.NO_RESULT:
+        try:
+            # A copy, and the same serializability rules as a child
+            response['result'] = json.loads(json.dumps(context.result))
+        except (TypeError, ValueError) as e:
+            return {
+                'ok': False,
+                'error': f"Task result is not JSON serializable: {e}",
+            }
+    return response
+
+
+class InProcessRunner:
+    """Runs trusted task code on a pool of threads in this interpreter
+
+    There is no process to start, so a trivial task takes microseconds,
+    but tasks share the caller's memory, imports and interpreter, and a
+    running task cannot be killed: a timeout abandons its thread. While
+    a runner is open, ``sys.stdout`` is a proxy that sends each task
+    thread's output to that task; close() puts the original back.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._threads = ThreadPoolExecutor(
+            max_workers, thread_name_prefix='enact-task')
+        _install_stdout()
+        self._closed = False
+
+    async def run(
+        self,
+        code: CodeType,
+        inputs: Dict[str, Any],
+        artifacts_dir: Optional[Path] = None,
+        max_output_bytes: Optional[int] = None,
+    ) -> TaskOutput:
+        """Run compiled task code on a task thread and return its output"""
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                self._threads, run_task, code, inputs,
+                str(artifacts_dir) if artifacts_dir is not None else None,
+                max_output_bytes)
+        except BaseException:
+            if artifacts_dir is not None:
+                shutil.rmtree(artifacts_dir, ignore_errors=True)
+            raise
+        return result_from_response(response, artifacts_dir)
+
+    def close(self) -> None:
+        self._threads.shutdown(wait=False)
+        if not self._closed:
+            self._closed = True
+            _uninstall_stdout()
@@ -0,0 +1,146 @@
+# src/enact/limits.py
+import asyncio
+import os
+import signal
+import time
+from functools import partial
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+from .models import ResourceLimits
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+T = TypeVar('T')
+
+# Children get their own process group so the whole tree can be killed
+NEW_SESSION = os.name == 'posix'
+
+
+class ResourceLimitExceeded(RuntimeError):
+    """A task was stopped for exceeding one of its ResourceLimits"""
+
+
+class TaskTimeout(ResourceLimitExceeded):
+    """A task ran past its wall-clock timeout"""
+
+
+class OutputLimitExceeded(ResourceLimitExceeded):
+    """A task wrote more output than its limits allow"""
+
+
+class Deadline:
+    """A wall-clock budget shared by several awaits
+
+    ``wait`` raises TaskTimeout once the budget is spent, cancelling
+    whatever it was awaiting. Without a timeout it simply awaits.
+    """
+
+    def __init__(self, timeout: Optional[float]):
+        self.timeout = timeout
+        self.expires = None if timeout is None else time.monotonic() + timeout
+
+    async def wait(self, awaitable: Awaitable[T]) -> T:
+        if self.expires is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(
+                awaitable, max(self.expires - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            raise TaskTimeout(
+                f"Task timed out after {self.timeout} seconds") from None
+
+
+def spawn_options(
+    limits: Optional[ResourceLimits], rlimits: bool = True
+) -> Dict[str, Any]:
+    """Keyword arguments for starting a child process under ``limits``
+
+    Works for subprocess.Popen and asyncio.create_subprocess_exec alike.
+    The rlimits are set between fork and exec when there are any, unless
+    ``rlimits`` is False because the child applies child_rlimits() to
+    itself. That is preferable: preexec_fn isn't safe in a process with
+    threads and rules out the faster ways of spawning.
+    """
+    if not NEW_SESSION:
+        return {}
+    options: Dict[str, Any] = {'start_new_session': True}
+    if rlimits and child_rlimits(limits):
+        options['preexec_fn'] = partial(
+            set_rlimits, limits.cpu_seconds, limits.memory_bytes)
+    return options
+
+
+def child_rlimits(limits: Optional[ResourceLimits]) -> Dict[str, int]:
+    """The CPU and memory limits a child should apply to itself, if any"""
+    if limits is None or resource is None:
+        return {}
+    return limits.model_dump(
+        include={'cpu_seconds', 'memory_bytes'}, exclude_none=True)
+
+
+def set_rlimits(
+    cpu_seconds: Optional[int], memory_bytes: Optional[int]
+) -> None:
+    """Apply CPU and address space limits to the current process"""
+    if cpu_seconds is not None:
+        # SIGXCPU at the soft limit, SIGKILL a second later if it's ignored
+        _set_rlimit(resource.RLIMIT_CPU, cpu_seconds, cpu_seconds + 1)
+    if memory_bytes is not None:
+        _set_rlimit(resource.RLIMIT_AS, memory_bytes, memory_bytes)
+
+
+def _set_rlimit(which: int, soft: int, hard: int) -> None:
+    _, current = resource.getrlimit(which)
+    if current != resource.RLIM_INFINITY:
+        # Only root may raise a hard limit
+        soft, hard = min(soft, current), min(hard, current)
+    resource.setrlimit(which, (soft, hard))
+
+
+def kill_process_tree(process) -> None:
+    """Kill a child started with spawn_options() and all it spawned"""
+    if NEW_SESSION and kill_process_group(process.pid):
+        return
+    if process.returncode is None:
+        process.kill()
+
+
+def kill_process_group(pid: int) -> bool:
+    """Kill the process group led by ``pid``; False if there is none"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+async def read_limited(
+    stream: asyncio.StreamReader, limit: Optional[int]
+) -> bytes:
+    """Read a stream to EOF, failing once it yields more than ``limit``"""
+    if limit is None:
+        return await stream.read()
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(64 * 1024)
+        if not chunk:
+            return b''.join(chunks)
+        size += len(chunk)
+        if size > limit:
+            raise OutputLimitExceeded(
+                f"Task output exceeded {limit} bytes")
+        chunks.append(chunk)
+
+
+def exit_error(returncode: int, stderr: str) -> RuntimeError:
+    """The error for a child that exited with a non-zero code"""
+    if hasattr(signal, 'SIGXCPU') and returncode == -signal.SIGXCPU:
+        return ResourceLimitExceeded("Task exceeded its CPU time limit")
+    if hasattr(signal, 'SIGALRM') and returncode == -signal.SIGALRM:
+        # Forked children enforce their own timeout with an alarm
+        return TaskTimeout("Task timed out")
+    return RuntimeError(f"Script execution failed: {stderr}")
@@ -0,0 +1,95 @@
+# src/enact/locks.py
+import os
+import time
+from pathlib import Path
+from typing import IO, Optional
+
+if os.name == 'nt':  # Windows
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileLock:
+    """Advisory inter-process lock backed by a lock file
+
+    Shared locks may be held by many processes at once and block exclusive
+    ones. On Windows only exclusive locks are supported and shared
+    acquisition always succeeds without locking.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file: Optional[IO] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        """Take the lock; returns False if non-blocking and unavailable"""
+        if self._file is not None:
+            raise RuntimeError(f"Lock {self.path} is already held")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, 'a+')
+        try:
+            if not _lock(lock_file, shared, blocking):
+                lock_file.close()
+                return False
+        except BaseException:
+            lock_file.close()
+            raise
+        self._file = lock_file
+        return True
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        try:
+            _unlock(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+if os.name == 'nt':
+    def _lock(lock_file: IO, shared: bool, blocking: bool) -> bool:
+        if shared:
+            return True
+        while True:
+            try:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                # LK_LOCK only retries for 10 seconds, so poll ourselves
+                time.sleep(0.05)
+
+    def _unlock(lock_file: IO) -> None:
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass  # Shared "locks" were never taken
+else:
+    def _lock(lock_file: IO, shared: bool, blocking: bool) -> bool:
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(lock_file.fileno(), operation)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _unlock(lock_file: IO) -> None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,241 @@
+# src/enact/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Phases of an execution, in the order they happen
+PHASES = (
+    "fetch",     # registry request; bytes are the response body
+    "validate",  # pydantic validation of the definition
+    "venv",      # venv lookup, or creation including installs
+    "install",   # pip runs while building a venv
+    "encode",    # serializing inputs for the child; bytes sent
+    "startup",   # interpreter start until the runner is ready
+    "run",       # the task code itself
+    "parse",     # decoding the task's JSON output; bytes received
+)
+
+
+class Timings:
+    """Seconds and byte counts per phase for a single execution"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.bytes: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float, nbytes: Optional[int] = None) -> None:
+        # Composite tasks pass through some phases once per step
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        if nbytes is not None:
+            self.bytes[phase] = self.bytes.get(phase, 0) + nbytes
+
+    @property
+    def total(self) -> float:
+        # Installs happen inside the venv phase
+        return sum(s for phase, s in self.seconds.items() if phase != "install")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"seconds": dict(self.seconds), "bytes": dict(self.bytes)}
+
+    def __repr__(self) -> str:
+        return f"Timings({self.as_dict()})"
+
+
+class Instrumentation:
+    """Receives one call per measured phase of every execution
+
+    Subclass this to forward timings to a metrics system; ``record`` may be
+    called from worker threads.
+    """
+
+    def record(
+        self,
+        phase: str,
+        seconds: float,
+        nbytes: Optional[int] = None,
+        task_id: Optional[str] = None,
+    ) -> None:
+        pass
+
+
+class CallbackInstrumentation(Instrumentation):
+    """Forward every measurement to a callable"""
+
+    def __init__(
+        self, callback: Callable[[str, float, Optional[int], Optional[str]], None]
+    ):
+        self.callback = callback
+
+    def record(self, phase, seconds, nbytes=None, task_id=None) -> None:
+        self.callback(phase, seconds, nbytes, task_id)
+
+
+class Histogram:
+    """Log-bucketed histogram; percentiles are accurate to within ~5%"""
+
+    GROWTH = 1.1
+    MIN_VALUE = 1e-6
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._buckets: Dict[int, int] = {}
+
+    def observe(self, value: float) -> None:
+        index = 0
+        if value > self.MIN_VALUE:
+            index = math.ceil(math.log(value / self.MIN_VALUE, self.GROWTH))
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile (0 < q <= 1)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(self.MIN_VALUE * self.GROWTH ** index, self.max)
+        return self.max
+
+
+class HistogramCollector(Instrumentation):
+    """In-memory latency histograms and byte totals per phase"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, seconds, nbytes=None, task_id=None) -> None:
+        with self._lock:
+            self.histograms.setdefault(phase, Histogram()).observe(seconds)
+            if nbytes is not None:
+                self.bytes[phase] = self.bytes.get(phase, 0) + nbytes
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                phase: {
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "p50": histogram.percentile(0.5),
+                    "p95": histogram.percentile(0.95),
+                    "p99": histogram.percentile(0.99),
+                    "max": histogram.max,
+                    "bytes": self.bytes.get(phase, 0),
+                }
+                for phase, histogram in self._ordered()
+            }
+
+    def export_prometheus(self, prefix: str = "enact") -> str:
+        """Render the histograms in the Prometheus text format"""
+        lines: List[str] = [f"# TYPE {prefix}_phase_seconds summary"]
+        with self._lock:
+            for phase, histogram in self._ordered():
+                for q in self.QUANTILES:
+                    lines.append(
+                        f'{prefix}_phase_seconds{{phase="{phase}",'
+                        f'quantile="{q}"}} {histogram.percentile(q)}')
+                lines.append(
+                    f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {histogram.sum}')
+                lines.append(
+                    f'{prefix}_phase_seconds_count{{phase="{phase}"}} '
+                    f'{histogram.count}')
+            lines.append(f"# TYPE {prefix}_phase_bytes_total counter")
+            for phase, nbytes in self.bytes.items():
+                lines.append(
+                    f'{prefix}_phase_bytes_total{{phase="{phase}"}} {nbytes}')
+        return "\n".join(lines) + "\n"
+
+    def _ordered(self):
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        return sorted(self.histograms.items(),
+                      key=lambda item: order.get(item[0], len(order)))
+
+
+class _Recorder:
+    def __init__(
+        self,
+        instrumentation: Optional[Instrumentation],
+        timings: Optional[Timings],
+        task_id: Optional[str],
+    ):
+        self.instrumentation = instrumentation
+        self.timings = timings
+        self.task_id = task_id
+
+    def record(self, phase: str, seconds: float, nbytes: Optional[int]) -> None:
+        if self.timings is not None:
+            self.timings.add(phase, seconds, nbytes)
+        if self.instrumentation is not None:
+            self.instrumentation.record(phase, seconds, nbytes, self.task_id)
+
+
+_recorder: ContextVar[Optional[_Recorder]] = ContextVar(
+    "enact_recorder", default=None)
+
+
+@contextmanager
+def recording(
+    instrumentation: Optional[Instrumentation] = None,
+    timings: Optional[Timings] = None,
+    task_id: Optional[str] = None,
+) -> Iterator[None]:
+    """Send phases measured in this context to instrumentation and timings
+
+    Without a new Timings object, an enclosing recording is kept as is.
+    """
+    outer = _recorder.get()
+    if timings is None and (instrumentation is None or outer is not None):
+        yield
+        return
+    if instrumentation is None and outer is not None:
+        instrumentation = outer.instrumentation
+    token = _recorder.set(_Recorder(instrumentation, timings, task_id))
+    try:
+        yield
+    finally:
+        _recorder.reset(token)
+
+
+def is_recording() -> bool:
+    return _recorder.get() is not None
+
+
+def record(phase: str, seconds: float, nbytes: Optional[int] = None) -> None:
+    """Report a phase measured by the caller"""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.record(phase, seconds, nbytes)
+
+
+class measure:
+    """Time a block as one phase; set ``nbytes`` inside it to report a size"""
+
+    def __init__(self, phase: str, nbytes: Optional[int] = None):
+        self.phase = phase
+        self.nbytes = nbytes
+        self._recorder: Optional[_Recorder] = None
+        self._started = 0.0
+
+    def __enter__(self) -> "measure":
+        self._recorder = _recorder.get()
+        if self._recorder is not None:
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._recorder is not None and exc_type is None:
+            self._recorder.record(
+                self.phase, time.perf_counter() - self._started, self.nbytes)
@@ -56,12 +56,52 @@ class Task(BaseModel):
 
 class FlowStep(BaseModel):
     task: str
+    id: Optional[str] = None  # Defaults to the task id
+    # Step ids this step waits for; None means the previous step
+    depends_on: Optional[List[str]] = None
+
+    @property
+    def step_id(self) -> str:
+        return self.id or self.task
 
 
 class Flow(BaseModel):
     steps: List[FlowStep]
 
 
+class ResourceLimits(BaseModel):
+    """Caps on one execution; unset fields are unlimited
+
+    ``timeout`` is wall-clock seconds for the whole execution,
+    ``cpu_seconds`` and ``memory_bytes`` (address space) are enforced
+    with rlimits in the child process, and ``max_output_bytes`` caps
+    what the task may write to each of stdout and stderr.
+    """
+    timeout: Optional[float] = None
+    cpu_seconds: Optional[int] = None
+    memory_bytes: Optional[int] = None
+    max_output_bytes: Optional[int] = None
+
+    def tighten(self, other: Optional["ResourceLimits"]) -> "ResourceLimits":
+        """The stricter of two sets of limits, field by field"""
+        if other is None:
+            return self
+        values = {}
+        for name in ResourceLimits.model_fields:
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if mine is None or theirs is None:
+                values[name] = theirs if mine is None else mine
+            else:
+                values[name] = min(mine, theirs)
+        return ResourceLimits(**values)
+
+    def override(self, other: Optional["ResourceLimits"]) -> "ResourceLimits":
+        """These limits with every field set in ``other`` replaced"""
+        if other is None:
+            return self
+        return self.model_copy(update=other.model_dump(exclude_none=True))
+
+
 class EnactTask(BaseModel):
     enact: str
     id: str
@@ -75,6 +115,39 @@ class EnactTask(BaseModel):
     flow: Flow
     outputs: Dict[str, TaskOutput]
     dependencies: Optional[Dependencies] = None  # New field
+    # Deterministic tasks may opt in to result memoization
+    cacheable: bool = False
+    limits: Optional[ResourceLimits] = None
 
     class Config:
         extra = "allow"  # Allow extra fields in the input data
+
+
+class ExecutionResult(BaseModel):
+    """Outcome of one item in a batch execution"""
+    index: int
+    inputs: Dict[str, Any]
+    output: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class WarmResult(BaseModel):
+    """Outcome of pre-warming one task"""
+    task_id: str
+    env_hash: Optional[str] = None
+    fetch_seconds: float = 0.0
+    venv_seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def seconds(self) -> float:
+        return self.fetch_seconds + self.venv_seconds
@@ -0,0 +1,133 @@
+# src/enact/outputs.py
+import json
+import marshal
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .limits import OutputLimitExceeded
+
+# Key of the handles save_artifact() returns inside task code
+ARTIFACT_KEY = '$artifact'
+RESULT_ENCODINGS = ("json", "marshal")
+DEFAULT_ARTIFACTS_DIR = Path(tempfile.gettempdir()) / 'enact-artifacts'
+
+_NO_RESULT = object()
+
+
+class Artifact(dict):
+    """A file a task saved with ``save_artifact()`` instead of inlining it
+
+    Behaves as the plain dict ``{"name", "path", "size", "content_type"}``,
+    so results holding artifacts stay JSON serializable. The file belongs
+    to the caller; call delete() once it has been consumed.
+    """
+
+    @property
+    def name(self) -> str:
+        return self['name']
+
+    @property
+    def path(self) -> Path:
+        return Path(self['path'])
+
+    @property
+    def size(self) -> int:
+        return self['size']
+
+    @property
+    def content_type(self) -> Optional[str]:
+        return self.get('content_type')
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def read_text(self, encoding: str = 'utf-8') -> str:
+        return self.path.read_text(encoding)
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+        try:
+            self.path.parent.rmdir()  # The run's directory, once empty
+        except OSError:
+            pass
+
+
+class TaskOutput:
+    """What an execution backend got back from one task run
+
+    ``stdout`` is whatever the task printed. If the task called
+    ``set_result()``, ``result`` holds that value and stdout is just log
+    output; otherwise stdout itself is the JSON result, as before.
+    """
+
+    def __init__(
+        self,
+        stdout: str,
+        result: Any = _NO_RESULT,
+        artifacts_dir: Optional[Path] = None,
+    ):
+        self.stdout = stdout
+        self.result = result
+        self.artifacts_dir = artifacts_dir
+
+    @property
+    def has_result(self) -> bool:
+        return self.result is not _NO_RESULT
+
+    @property
+    def has_artifacts(self) -> bool:
+        return self.artifacts_dir is not None and self.artifacts_dir.exists()
+
+
+def decode_result(data: bytes, encoding: str) -> Any:
+    if encoding == "marshal":
+        return marshal.loads(data)
+    return json.loads(data)
+
+
+def resolve_artifacts(value: Any) -> Any:
+    """Replace artifact handles in a task result with Artifact objects"""
+    if isinstance(value, dict):
+        if ARTIFACT_KEY in value and len(value) == 1:
+            return Artifact(value[ARTIFACT_KEY])
+        return {key: resolve_artifacts(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_artifacts(item) for item in value]
+    return value
+
+
+def contains_artifacts(value: Any) -> bool:
+    """Whether a parsed result holds any Artifact"""
+    if isinstance(value, Artifact):
+        return True
+    if isinstance(value, dict):
+        return any(contains_artifacts(item) for item in value.values())
+    if isinstance(value, list):
+        return any(contains_artifacts(item) for item in value)
+    return False
+
+
+def as_task_output(output: Any) -> TaskOutput:
+    """Accept plain stdout from backends that predate TaskOutput"""
+    if isinstance(output, TaskOutput):
+        return output
+    return TaskOutput(output)
+
+
+def result_from_response(
+    response: Dict[str, Any], artifacts_dir: Optional[Path]
+) -> TaskOutput:
+    """Build a TaskOutput from a _worker.py response message"""
+    if not response['ok']:
+        if artifacts_dir is not None:
+            shutil.rmtree(artifacts_dir, ignore_errors=True)
+        if response.get('limit') == 'output':
+            raise OutputLimitExceeded(response['error'])
+        raise RuntimeError(f"Script execution failed: {response['error']}")
+    return TaskOutput(
+        response['stdout'],
+        response['result'] if 'result' in response else _NO_RESULT,
+        artifacts_dir,
+    )
@@ -0,0 +1,109 @@
+# src/enact/profiling.py
+import marshal
+import pstats
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# pstats function key: (filename, line number, function name)
+FunctionKey = Tuple[str, int, str]
+
+
+class TaskProfile:
+    """cProfile data collected from a task inside its venv interpreter
+
+    Pass one to ``execute_task(..., profile=...)`` to have it filled in. The
+    raw data is in the format cProfile writes, so saved profiles open with
+    ``pstats``, snakeviz and similar tools.
+    """
+
+    def __init__(self, data: Optional[bytes] = None):
+        self.data = data
+
+    @classmethod
+    def load(cls, path: Path) -> "TaskProfile":
+        return cls(Path(path).read_bytes())
+
+    def save(self, path: Path) -> None:
+        Path(path).write_bytes(self._require_data())
+
+    @property
+    def stats(self) -> pstats.Stats:
+        """The profile as a pstats.Stats, e.g. for ``print_stats()``"""
+        stats = pstats.Stats()
+        stats.stats = marshal.loads(self._require_data())
+        stats.get_top_level_stats()
+        return stats
+
+    def to_collapsed(
+        self,
+        scale: float = 1e6,
+        max_depth: int = 128,
+        min_fraction: float = 1e-4,
+    ) -> str:
+        """Render folded stacks ("a;b;c weight" lines) for flamegraph tools
+
+        cProfile records caller/callee pairs rather than whole stacks, so
+        stacks are rebuilt from the call graph and each callee's time is
+        split between its callers in proportion to the calls they made.
+        Weights are self time in microseconds by default.
+
+        Call graphs with shared callees have exponentially many paths, so
+        stacks stop at ``max_depth`` frames and a call whose share of the
+        time is under ``min_fraction`` of the total is left out along with
+        everything below it, as it would be too narrow to see anyway.
+        """
+        raw = marshal.loads(self._require_data())
+        callees: Dict[FunctionKey, List[Tuple[FunctionKey, float]]] = {}
+        for function, (_, _, _, cumulative, callers) in raw.items():
+            for caller, (_, _, _, edge_cumulative) in callers.items():
+                share = edge_cumulative / cumulative if cumulative else 0.0
+                callees.setdefault(caller, []).append((function, share))
+
+        total = sum(stats[2] for stats in raw.values())
+        threshold = total * min_fraction
+        weights: Dict[str, float] = {}
+        stack: List[str] = []
+        on_stack = set()
+
+        def walk(function: FunctionKey, fraction: float):
+            stack.append(_label(function))
+            on_stack.add(function)
+            self_time = raw[function][2] * fraction
+            if self_time > 0:
+                key = ';'.join(stack)
+                weights[key] = weights.get(key, 0.0) + self_time
+            if len(stack) < max_depth:
+                for callee, share in callees.get(function, []):
+                    # Recursion would otherwise never terminate
+                    if callee not in raw or callee in on_stack:
+                        continue
+                    cost = raw[callee][3] * fraction * share
+                    if cost > 0 and cost >= threshold:
+                        walk(callee, fraction * share)
+            stack.pop()
+            on_stack.discard(function)
+
+        for function, (_, _, _, _, callers) in raw.items():
+            if not callers:
+                walk(function, 1.0)
+
+        return ''.join(
+            f"{stack} {round(weight * scale)}\n"
+            for stack, weight in sorted(weights.items())
+            if round(weight * scale) > 0
+        )
+
+    def save_collapsed(self, path: Path) -> None:
+        Path(path).write_text(self.to_collapsed())
+
+    def _require_data(self) -> bytes:
+        if self.data is None:
+            raise ValueError("Profile has no data yet")
+        return self.data
+
+
+def _label(function: FunctionKey) -> str:
+    filename, line, name = function
+    if filename == '~':
+        return name  # Built-ins such as <built-in method time.sleep>
+    return f"{name} ({Path(filename).name}:{line})"
@@ -0,0 +1,210 @@
+# src/enact/worker_pool.py
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional
+
+from .limits import OutputLimitExceeded, kill_process_tree, spawn_options
+from .outputs import TaskOutput, result_from_response
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).parent / '_worker.py'
+HEADER = struct.Struct('>Q')
+
+
+class WorkerCrashed(RuntimeError):
+    """A worker interpreter exited while running a task"""
+
+
+class Worker:
+    """A long-lived interpreter running tasks over a pipe protocol"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.tasks_run = 0
+        self.last_used = time.monotonic()
+
+    @classmethod
+    async def start(cls, python_path: Path) -> "Worker":
+        process = await asyncio.create_subprocess_exec(
+            str(python_path), str(WORKER_SCRIPT),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            **spawn_options(None),
+        )
+        logger.debug("Started worker %s for %s", process.pid, python_path)
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def run(
+        self,
+        code: str,
+        inputs: Dict[str, Any],
+        artifacts_dir: Optional[Path] = None,
+        max_output_bytes: Optional[int] = None,
+        code_path: Optional[Path] = None,
+    ) -> Dict[str, Any]:
+        """Send one task to the worker and wait for its response"""
+        request = {'code': code, 'inputs': inputs}
+        if artifacts_dir is not None:
+            request['artifacts_dir'] = str(artifacts_dir)
+        if code_path is not None:
+            request['code_path'] = str(code_path)
+        if max_output_bytes is not None:
+            # Checked as the task prints, so output can't pile up in memory
+            request['max_output_bytes'] = max_output_bytes
+        payload = json.dumps(request).encode()
+        try:
+            self.process.stdin.write(HEADER.pack(len(payload)) + payload)
+            await self.process.stdin.drain()
+            header = await self.process.stdout.readexactly(HEADER.size)
+            (size,) = HEADER.unpack(header)
+            if max_output_bytes is not None and size > max_output_bytes:
+                raise OutputLimitExceeded(
+                    f"Task output exceeded {max_output_bytes} bytes")
+            response = json.loads(await self.process.stdout.readexactly(size))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            returncode = await self.process.wait()
+            raise WorkerCrashed(
+                f"Worker exited unexpectedly with code {returncode}") from e
+        finally:
+            self.tasks_run += 1
+            self.last_used = time.monotonic()
+        return response
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Ask the worker to exit, killing it if it does not"""
+        if not self.alive:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.kill()
+
+    async def kill(self) -> None:
+        if self.alive:
+            kill_process_tree(self.process)
+        await self.process.wait()
+
+
+class _EnvWorkers:
+    def __init__(self, max_workers: int):
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.idle: Deque[Worker] = deque()
+
+
+class WorkerPool:
+    """Pools of warm worker interpreters, one pool per venv interpreter
+
+    Workers keep imported modules loaded between tasks, so steady-state
+    latency is not bounded by interpreter startup. A worker is replaced
+    after ``max_tasks_per_worker`` tasks, when it crashes, and when it has
+    been idle for longer than ``idle_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_tasks_per_worker: Optional[int] = 100,
+        idle_timeout: Optional[float] = 300.0,
+    ):
+        self.max_workers = max_workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.idle_timeout = idle_timeout
+        self._envs: Dict[Path, _EnvWorkers] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def run(
+        self,
+        python_path: Path,
+        code: str,
+        inputs: Dict[str, Any],
+        artifacts_dir: Optional[Path] = None,
+        max_output_bytes: Optional[int] = None,
+        code_path: Optional[Path] = None,
+    ) -> TaskOutput:
+        """Run task code on a warm worker and return its output
+
+        ``code_path`` points at the code compiled by a CodeCache; workers
+        also keep code objects they have loaded for later runs.
+        """
+        env = self._envs.get(python_path)
+        if env is None:
+            env = self._envs[python_path] = _EnvWorkers(self.max_workers)
+        self._ensure_reaper()
+
+        async with env.semaphore:
+            worker = await self._checkout(env, python_path)
+            try:
+                response = await worker.run(
+                    code, inputs, artifacts_dir, max_output_bytes, code_path)
+            except BaseException:
+                # The worker's state is unknown after a crash or cancellation
+                await worker.kill()
+                raise
+            await self._checkin(env, worker)
+
+        return result_from_response(response, artifacts_dir)
+
+    async def aclose(self) -> None:
+        """Stop every idle worker and the idle reaper"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for env in list(self._envs.values()):
+            while env.idle:
+                await env.idle.pop().stop()
+        self._envs.clear()
+
+    async def _checkout(self, env: _EnvWorkers, python_path: Path) -> Worker:
+        while env.idle:
+            # Reuse the most recently used worker so cold ones can idle out
+            worker = env.idle.pop()
+            if worker.alive:
+                return worker
+        return await Worker.start(python_path)
+
+    async def _checkin(self, env: _EnvWorkers, worker: Worker) -> None:
+        if (
+            self.max_tasks_per_worker is not None
+            and worker.tasks_run >= self.max_tasks_per_worker
+        ):
+            logger.debug("Recycling worker %s", worker.process.pid)
+            await worker.stop()
+        elif worker.alive:
+            env.idle.append(worker)
+
+    def _ensure_reaper(self) -> None:
+        if self.idle_timeout is None:
+            return
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap_idle())
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await self._stop_idle(time.monotonic() - self.idle_timeout)
+            except Exception:
+                # Keep reaping on later rounds rather than end the task
+                logger.exception("Failed to stop idle workers")
+
+    async def _stop_idle(self, cutoff: float) -> None:
+        """Stop the workers that have been idle since before ``cutoff``"""
+        # A copy, as runs may add venvs while a worker stops
+        for env in list(self._envs.values()):
+            # Idle workers are ordered oldest first
+            while env.idle and env.idle[0].last_used < cutoff:
+                worker = env.idle.popleft()
+                logger.debug("Stopping idle worker %s", worker.process.pid)
+                await worker.stop()
@@ -0,0 +1,56 @@
+import copy
+
+import httpx
+import pytest
+from enact.models import EnactTask
+
+TASK_DEFINITION = {
+    "enact": "1.0.0",
+    "id": "HelloWorld",
+    "name": "Hello World",
+    "description": "A simple hello world task",
+    "version": "1.0.0",
+    "authors": [{"name": "Test User"}],
+    "inputs": {"name": {"type": "string", "description": "Name to greet"}},
+    "tasks": [
+        {
+            "id": "greet",
+            "type": "script",
+            "language": "python",
+            "code": "print(json.dumps({'greeting': 'Hello, ' + inputs['name']}))",
+        }
+    ],
+    "flow": {"steps": [{"task": "greet"}]},
+    "outputs": {"greeting": {"type": "string", "description": "Greeting"}},
+}
+
+
+@pytest.fixture
+def task_definition():
+    """A valid atomic task definition; each test gets its own copy"""
+    return copy.deepcopy(TASK_DEFINITION)
+
+
+@pytest.fixture
+def make_task(task_definition):
+    """Build a single-step task running the given code"""
+    def make(code: str) -> EnactTask:
+        definition = dict(task_definition)
+        definition["tasks"] = [
+            {"id": "main", "type": "script", "language": "python", "code": code}]
+        return EnactTask.model_validate(definition)
+    return make
+
+
+@pytest.fixture
+def registry_transport(task_definition):
+    """Build a mock registry that records every request it receives"""
+    def transport(requests):
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            if request.url.path == "/api/yaml/search":
+                return httpx.Response(200, json=[])
+            return httpx.Response(200, json={
+                "type": "atomic", "protocolDetails": dict(task_definition)})
+        return httpx.MockTransport(handler)
+    return transport
@@ -0,0 +1,118 @@
+import json
+
+import httpx
+import pytest
+from enact import EnactClient, ResultCache, TaskCache
+from enact.backends import ExecutionBackend
+
+
+
+def etag_transport(requests, definition, etag='"v1"'):
+    """Mock registry that honours If-None-Match"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(
+            200,
+            json={"protocolDetails": dict(definition)},
+            headers={"ETag": etag},
+        )
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_repeat_get_task_is_served_from_memory(task_definition):
+    requests = []
+    async with EnactClient(
+        "http://registry", transport=etag_transport(requests, task_definition)
+    ) as client:
+        first = await client.get_task("HelloWorld")
+        second = await client.get_task("HelloWorld")
+
+    assert first is second
+    assert len(requests) == 1
+    assert client.task_cache.stats.hits == 1
+    assert client.task_cache.stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_revalidated_with_etag(task_definition):
+    requests = []
+    cache = TaskCache(ttl=0)
+    async with EnactClient(
+        "http://registry", transport=etag_transport(requests, task_definition),
+        task_cache=cache,
+    ) as client:
+        first = await client.get_task("HelloWorld")
+        second = await client.get_task("HelloWorld")
+
+    assert first is second
+    assert requests[1].headers["if-none-match"] == '"v1"'
+    assert cache.stats.revalidations == 1
+
+
+def test_lru_eviction_and_disk_tier(tmp_path, task_definition):
+    from enact.models import EnactTask
+
+    task = EnactTask.model_validate(task_definition)
+    cache = TaskCache(maxsize=1, cache_dir=tmp_path)
+    cache.put("a", task, task_definition)
+    cache.put("b", task, task_definition)
+
+    assert "a" not in cache
+    assert cache.stats.evictions == 1
+
+    # A new process sharing the directory starts warm
+    reloaded = TaskCache(cache_dir=tmp_path).get("a")
+    assert reloaded is not None and reloaded.is_fresh()
+    assert reloaded.task.id == "HelloWorld"
+
+
+class CountingBackend(ExecutionBackend):
+    """Backend that echoes its inputs and counts executions"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.calls = 0
+
+    async def run(self, venv_path, code, inputs):
+        self.calls += 1
+        return json.dumps({"echo": inputs})
+
+
+@pytest.mark.asyncio
+async def test_result_cache_only_memoizes_cacheable_tasks(
+    tmp_path, task_definition
+):
+    from enact.dependency_manager import DependencyManager
+    from enact.executor import TaskExecutor
+    from enact.models import EnactTask
+
+    backend = CountingBackend()
+    cache = ResultCache(cache_dir=tmp_path)
+    executor = TaskExecutor(
+        backend, DependencyManager(tmp_path / "venvs"), result_cache=cache)
+    pure = EnactTask.model_validate(dict(task_definition, cacheable=True))
+    impure = EnactTask.model_validate(task_definition)
+
+    for _ in range(3):
+        result = await executor.run(pure, {"b": 1, "a": [1, 2]}, tmp_path)
+        result["echo"] = "mutated by caller"
+    await executor.run(impure, {}, tmp_path)
+    await executor.run(impure, {}, tmp_path)
+
+    assert backend.calls == 3
+    assert cache.stats.hits == 2 and cache.stats.misses == 1
+    assert (await executor.run(pure, {"a": [1, 2], "b": 1}, tmp_path)) == {
+        "echo": {"a": [1, 2], "b": 1}}
+
+
+def test_result_cache_disk_tier_is_size_capped(tmp_path):
+    cache = ResultCache(maxsize=0, cache_dir=tmp_path, max_disk_bytes=100)
+    for i in range(10):
+        cache.put(f"key{i}", {"value": "x" * 20})
+
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.json")) <= 100
+    assert cache.get("key9") == {"value": "x" * 20}
+    assert cache.get("key0") is None
@@ -1,4 +1,6 @@
+import asyncio
 import pytest
+import httpx
 from enact import EnactClient
 
 @pytest.mark.asyncio
@@ -12,3 +14,94 @@ async def test_execute_task():
     client = EnactClient("http://localhost:8000")
     # Add your tests here
     assert True
+
+
+@pytest.mark.asyncio
+async def test_client_reuses_pooled_connection(registry_transport):
+    requests = []
+    async with EnactClient(
+        "http://localhost:8000/", transport=registry_transport(requests)
+    ) as client:
+        pool = client.http
+        task = await client.get_task("HelloWorld")
+        await client.search_tasks("hello")
+        assert client.http is pool
+
+    assert task.id == "HelloWorld"
+    assert [r.url.path for r in requests] == [
+        "/api/yaml/tasks/HelloWorld", "/api/yaml/search"]
+    assert pool.is_closed
+
+
+@pytest.mark.asyncio
+async def test_concurrent_get_task_is_coalesced(registry_transport):
+    requests = []
+    async with EnactClient(
+        "http://localhost:8000", transport=registry_transport(requests)
+    ) as client:
+        tasks = await asyncio.gather(
+            *(client.get_task("HelloWorld") for _ in range(50)))
+
+    assert len(requests) == 1
+    assert all(task is tasks[0] for task in tasks)
+
+
+@pytest.mark.asyncio
+async def test_get_tasks_preserves_input_order(registry_transport):
+    requests = []
+    async with EnactClient(
+        "http://localhost:8000", transport=registry_transport(requests)
+    ) as client:
+        tasks = await client.get_tasks(["b", "a", "b"], concurrency=2)
+
+    assert len(tasks) == 3
+    assert tasks[0] is tasks[2]
+    assert sorted(r.url.path for r in requests) == [
+        "/api/yaml/tasks/a", "/api/yaml/tasks/b"]
+
+
+@pytest.mark.asyncio
+async def test_warm_builds_each_venv_once_and_reports_failures(
+    tmp_path, registry_transport
+):
+    from enact.dependency_manager import DependencyManager
+
+    requests = []
+    inner = registry_transport(requests)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/Missing"):
+            return httpx.Response(404)
+        return inner.handle_request(request)
+
+    async with EnactClient(
+        "http://localhost:8000",
+        transport=httpx.MockTransport(handler),
+        dependency_manager=DependencyManager(tmp_path),
+    ) as client:
+        results = await client.warm(["HelloWorld", "Other", "Missing"])
+
+    assert [r.task_id for r in results] == ["HelloWorld", "Other", "Missing"]
+    assert [r.ok for r in results] == [True, True, False]
+    assert results[0].env_hash == results[1].env_hash
+    assert (tmp_path / results[0].env_hash).is_dir()
+    assert "404" in results[2].error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("concurrency", [0, -1])
+async def test_concurrency_must_be_positive(tmp_path, concurrency):
+    from enact.dependency_manager import DependencyManager
+
+    async with EnactClient(
+        "http://localhost:8000",
+        dependency_manager=DependencyManager(tmp_path),
+    ) as client:
+        with pytest.raises(ValueError, match="concurrency must be >= 1"):
+            await client.get_tasks(["a"], concurrency=concurrency)
+        with pytest.raises(ValueError, match="concurrency must be >= 1"):
+            await client.warm(["a"], concurrency=concurrency)
+        with pytest.raises(ValueError, match="concurrency must be >= 1"):
+            async for _ in client.execute_many(
+                    "a", [{}], concurrency=concurrency):
+                pass
@@ -0,0 +1,321 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import virtualenv
+from enact.dependency_manager import COMPLETE_MARKER, DependencyManager
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Record every virtualenv creation"""
+    calls = []
+    cli_run = virtualenv.cli_run
+
+    def counting_cli_run(args, *rest, **kwargs):
+        calls.append(args[0])
+        return cli_run(args, *rest, **kwargs)
+
+    monkeypatch.setattr(virtualenv, "cli_run", counting_cli_run)
+    return calls
+
+
+def test_concurrent_callers_build_a_venv_once(tmp_path, builds):
+    manager = DependencyManager(tmp_path)
+    with ThreadPoolExecutor(8) as pool:
+        paths = list(pool.map(lambda _: manager._get_cached_venv({}), range(8)))
+
+    assert len(builds) == 1
+    assert len(set(paths)) == 1
+    assert (paths[0] / COMPLETE_MARKER).exists()
+    # Only the published venv and the lock directory remain
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        ".locks", paths[0].name]
+
+
+@pytest.mark.asyncio
+async def test_async_callers_share_one_build(tmp_path, builds):
+    manager = DependencyManager(tmp_path)
+    paths = await asyncio.gather(
+        *(manager.get_cached_venv_async({}) for _ in range(8)))
+
+    assert len(builds) == 1
+    assert len(set(paths)) == 1
+    for path in paths:
+        manager.release(path)
+
+
+@pytest.mark.asyncio
+async def test_resolved_venvs_are_held_until_released(tmp_path):
+    import os
+
+    manager = DependencyManager(tmp_path)
+    venv_path = await manager.get_cached_venv_async({})
+    marker = venv_path / COMPLETE_MARKER
+    os.utime(marker, (0, 0))
+
+    assert manager.prune(max_entries=0, min_idle=0) == []
+    manager.release(venv_path)
+    # Every use stamps the venv's last use
+    with manager.using(venv_path):
+        assert marker.stat().st_mtime > 0
+    assert [v.path for v in manager.prune(max_entries=0, min_idle=0)] == [
+        venv_path]
+
+
+def test_unmarked_venv_is_rebuilt(tmp_path, builds):
+    manager = DependencyManager(tmp_path)
+    half_built = tmp_path / manager._get_env_hash({})
+    half_built.mkdir()
+    (half_built / "junk").touch()
+
+    venv_path = manager._get_cached_venv({})
+
+    assert venv_path == half_built
+    assert len(builds) == 1
+    assert not (venv_path / "junk").exists()
+    assert (venv_path / COMPLETE_MARKER).exists()
+
+
+def test_prune_evicts_least_recently_used_idle_venvs(tmp_path):
+    import os
+
+    manager = DependencyManager(tmp_path)
+    old = manager._get_cached_venv({"old": True})
+    held = manager._get_cached_venv({"held": True})
+    new = manager._get_cached_venv({})
+    for age, path in [(300, held), (200, old), (100, new)]:
+        stamp = os.path.getmtime(path / COMPLETE_MARKER) - age
+        os.utime(path / COMPLETE_MARKER, (stamp, stamp))
+
+    with manager.using(held):
+        evicted = manager.prune(max_entries=2, min_idle=50)
+
+    assert [v.path for v in evicted] == [old]
+    # Holding a venv counts as using it
+    assert [v.path for v in manager.list_venvs()] == [new, held]
+    assert not old.exists()
+    assert all(v.size > 0 for v in manager.list_venvs())
+
+
+def test_gc_command(tmp_path, capsys):
+    from enact.cli import main, parse_size
+
+    manager = DependencyManager(tmp_path)
+    manager._get_cached_venv({})
+
+    assert main(["gc", "--cache-dir", str(tmp_path), "--max-entries", "0",
+                 "--min-idle", "0", "--dry-run"]) == 0
+    assert "Would evict 1 venv(s)" in capsys.readouterr().out
+    assert main(["prune", "--cache-dir", str(tmp_path), "--max-bytes", "0",
+                 "--min-idle", "0"]) == 0
+    assert manager.list_venvs() == []
+    assert parse_size("1.5G") == 1024 ** 3 * 3 // 2
+
+
+def test_base_layers_are_shared_through_pth_files(tmp_path, monkeypatch):
+    import subprocess
+
+    installs = []
+
+    def fake_install(self, venv_path, requirements):
+        # Pretend to pip install by dropping a module per requirement that
+        # no linked layer satisfies yet
+        installs.append((venv_path.parent.name, requirements))
+        for requirement in requirements:
+            name = requirement.split("=")[0].split(">")[0]
+            if any(self.layers_dir.rglob(f"{name}.py")):
+                continue
+            (self._get_site_packages(venv_path) / f"{name}.py").write_text(
+                f"WHERE = {str(venv_path.parent.name)!r}\n")
+
+    monkeypatch.setattr(DependencyManager, "_install_packages", fake_install)
+    manager = DependencyManager(
+        tmp_path, base_layers=[["basepkg==1.0", "otherpkg==2.0"]])
+    with_layer = {"python": {"packages": [
+        {"name": "basepkg", "version": "==1.0"},
+        {"name": "extra", "version": ">=0"},
+    ]}}
+
+    first = manager._get_cached_venv(with_layer)
+    manager._get_cached_venv({"python": {"packages": [
+        {"name": "otherpkg", "version": "==2.0"}]}})
+
+    # The layer was built once and both venvs link to it
+    assert [where for where, _ in installs].count(".layers") == 1
+    python = manager._get_python_path(first)
+    output = subprocess.run(
+        [str(python), "-c", "import basepkg, otherpkg; print(basepkg.WHERE)"],
+        capture_output=True, text=True, check=True).stdout
+    assert output.strip() == ".layers"
+
+
+def test_equivalent_dependency_specs_share_a_hash(tmp_path):
+    manager = DependencyManager(tmp_path)
+    spec = {"python": {"version": ">=3.9", "packages": [
+        {"name": "Requests", "version": "<3, >=2.0"},
+        {"name": "numpy", "version": ">=1.24"},
+    ]}}
+    equivalent = {"python": {"version": ">= 3.9", "packages": [
+        {"name": "numpy", "version": ">=1.24"},
+        {"name": "requests", "version": ">=2.0,<3"},
+    ]}}
+
+    assert manager._get_env_hash(spec) == manager._get_env_hash(equivalent)
+    assert manager._get_env_hash({"python": None}) == manager._get_env_hash({})
+    assert manager._get_env_hash(spec) != manager._get_env_hash(
+        {"python": {"packages": [{"name": "requests", "version": ">=2.1"}]}})
+
+
+def test_rebuild_installs_lockfile_from_wheelhouse(tmp_path, monkeypatch):
+    pip_calls = []
+    monkeypatch.setattr(
+        DependencyManager, "_run_pip",
+        lambda self, venv_path, args: pip_calls.append(args) or "")
+    manager = DependencyManager(tmp_path, offline=True)
+    dependencies = {"python": {"packages": [{"name": "six", "version": ">=1"}]}}
+    lockfile = manager._lockfile_path(
+        tmp_path / manager._get_env_hash(dependencies))
+    lockfile.parent.mkdir()
+    lockfile.write_text("six==1.17.0\n")
+
+    manager._get_cached_venv(dependencies)
+
+    # No resolution, no index: just the locked pins from local wheels
+    assert pip_calls == [[
+        "install", "--no-index", "--no-deps", "--find-links",
+        str(tmp_path / ".wheelhouse"), "six==1.17.0"]]
+
+
+def test_prebuilt_venvs_are_shared_through_an_artifact_store(
+        tmp_path, builds):
+    import subprocess
+    from enact.artifacts import DirectoryArtifactStore
+
+    store = DirectoryArtifactStore(tmp_path / "store")
+    first = DependencyManager(tmp_path / "node1", artifact_store=store)
+    built = first._get_cached_venv({})
+    script = next(p for p in (built / "bin").iterdir()
+                  if p.name.startswith("pip") and not p.is_symlink())
+
+    second = DependencyManager(tmp_path / "node2", artifact_store=store)
+    fetched = second._get_cached_venv({})
+
+    assert len(builds) == 1
+    assert fetched == tmp_path / "node2" / built.name
+    assert (fetched / COMPLETE_MARKER).exists()
+    # Scripts point at the new location
+    assert str(fetched).encode() in (fetched / "bin" / script.name).read_bytes()
+    assert str(built).encode() not in (
+        fetched / "bin" / script.name).read_bytes()
+    output = subprocess.run(
+        [str(second._get_python_path(fetched)), "-c",
+         "import sys; print(sys.prefix)"],
+        capture_output=True, text=True, check=True).stdout
+    assert output.strip() == str(fetched)
+
+
+def test_export_and_import_commands(tmp_path, capsys):
+    from enact.cli import main
+
+    manager = DependencyManager(tmp_path / "node1")
+    env_hash = manager._get_cached_venv({}).name
+    archive = tmp_path / "venv.tar.gz"
+
+    assert main(["export", env_hash, str(archive),
+                 "--cache-dir", str(tmp_path / "node1")]) == 0
+    assert main(["import", str(archive),
+                 "--cache-dir", str(tmp_path / "node2")]) == 0
+    assert (tmp_path / "node2" / env_hash / COMPLETE_MARKER).exists()
+    assert f"Imported {env_hash}" in capsys.readouterr().out
+
+
+def _archive(path, members, env_hash="0123456789ab"):
+    """Write a venv archive holding ``members`` (TarInfo, data) pairs"""
+    import io
+    import json
+    import tarfile
+    from enact.artifacts import ARTIFACT_METADATA, platform_tag
+
+    metadata = json.dumps({
+        "env_hash": env_hash, "path": "/elsewhere/" + env_hash,
+        "platform": platform_tag(),
+    }).encode()
+    with tarfile.open(path, "w:gz") as tar:
+        for info, data in members + [
+                (tarfile.TarInfo(ARTIFACT_METADATA), metadata)]:
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return path
+
+
+@pytest.mark.parametrize("member", [
+    "../escaped", "/tmp/escaped", "bin/../../escaped", "link", "lib/escaped",
+])
+def test_unsafe_archives_are_rejected(tmp_path, member):
+    import tarfile
+    from enact.artifacts import unpack_venv
+
+    def entry(name, kind=tarfile.REGTYPE, linkname=""):
+        info = tarfile.TarInfo(name)
+        info.type, info.linkname = kind, linkname
+        return info, b"" if kind != tarfile.REGTYPE else b"data"
+
+    members = {
+        # A symlink out of the venv, and a file written through a link
+        "link": [entry("link", tarfile.SYMTYPE, str(tmp_path / "escaped"))],
+        "lib/escaped": [
+            entry("lib", tarfile.SYMTYPE, str(tmp_path)),
+            entry("lib/escaped"),
+        ],
+    }.get(member, [entry(member)])
+    archive = _archive(tmp_path / "evil.tar.gz", members)
+
+    with pytest.raises(ValueError, match="Unsafe"):
+        unpack_venv(archive, tmp_path / "dest")
+    assert not (tmp_path / "escaped").exists()
+
+
+def test_import_rejects_invalid_env_hashes(tmp_path):
+    archive = _archive(tmp_path / "venv.tar.gz", [], env_hash="../outside")
+    with pytest.raises(ValueError, match="invalid env hash"):
+        DependencyManager(tmp_path / "venvs").import_venv(archive)
+    assert not (tmp_path / "outside").exists()
+
+
+def test_prune_removes_unused_compiled_code(tmp_path):
+    import os
+    import time
+
+    manager = DependencyManager(tmp_path / "venvs")
+    unused = manager.code_cache.path_for("x = 1")
+    used = manager.code_cache.path_for("x = 2")
+    last_week = time.time() - 8 * 24 * 3600
+    os.utime(unused, (last_week, last_week))
+
+    assert manager.prune(dry_run=True) == []
+    assert unused.exists()
+    manager.prune()
+    assert not unused.exists()
+    assert used.exists()
+
+
+def test_compiled_code_is_loaded_by_later_clients(tmp_path, monkeypatch):
+    import builtins
+
+    from enact.codecache import CodeCache
+
+    CodeCache(tmp_path).compile("x = 1")
+    compiled = []
+    real_compile = builtins.compile
+
+    def counting_compile(*args, **kwargs):
+        compiled.append(args[0])
+        return real_compile(*args, **kwargs)
+
+    monkeypatch.setattr(builtins, "compile", counting_compile)
+    namespace = {}
+    exec(CodeCache(tmp_path).compile("x = 1"), namespace)
+
+    assert namespace["x"] == 1
+    assert compiled == []
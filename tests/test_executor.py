@@ -0,0 +1,567 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from enact.backends import (
+    ForkServerBackend, SubprocessBackend, WorkerPoolBackend
+)
+from enact.dependency_manager import DependencyManager
+from enact.executor import TaskExecutor
+from enact.models import EnactTask
+
+
+
+@pytest.fixture(scope="module")
+def dependency_manager(tmp_path_factory):
+    return DependencyManager(tmp_path_factory.mktemp("venvs"))
+
+
+@pytest.fixture
+def executor(dependency_manager):
+    return TaskExecutor(dependency_manager=dependency_manager)
+
+
+@pytest.mark.asyncio
+async def test_execute_locally_async_runs_concurrently(executor, make_task):
+    task = make_task(
+        "import time\n"
+        "time.sleep(0.5)\n"
+        "print(json.dumps({'greeting': 'Hello, ' + inputs['name']}))\n"
+    )
+    # Build the venv up front so only execution is timed
+    venv_path = await executor.dependency_manager.get_cached_venv_async({})
+    executor.dependency_manager.release(venv_path)
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(
+        executor.execute_locally_async(
+            task, executor.create_script(task, {"name": str(i)}))
+        for i in range(4)
+    ))
+
+    assert [r["greeting"] for r in results] == [
+        "Hello, 0", "Hello, 1", "Hello, 2", "Hello, 3"]
+    assert time.monotonic() - started < 1.5
+
+
+@pytest.mark.asyncio
+async def test_execute_locally_async_reports_failures(executor, make_task):
+    task = make_task("raise SystemExit('boom')")
+    with pytest.raises(RuntimeError, match="boom"):
+        await executor.execute_locally_async(task, executor.create_script(task, {}))
+
+
+@pytest.mark.asyncio
+async def test_execute_many_reports_per_item_errors(executor, make_task):
+    from enact import EnactClient
+
+    task = make_task(
+        "print(json.dumps({'inverse': 1 / inputs['n']}))")
+
+    class Client(EnactClient):
+        async def get_task(self, task_id, **kwargs):
+            return task
+
+    client = Client(
+        "http://registry", dependency_manager=executor.dependency_manager)
+    client.executor = executor
+    results = [
+        r async for r in client.execute_many(
+            "Inverse", ({"n": n} for n in [1, 0, 2, 4]),
+            concurrency=2, ordered=True)
+    ]
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert [r.ok for r in results] == [True, False, True, True]
+    assert "ZeroDivisionError" in results[1].error
+    assert results[3].output == {"inverse": 0.25}
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_reuses_and_recycles_workers(
+    dependency_manager, make_task
+):
+    backend = WorkerPoolBackend(dependency_manager, max_tasks_per_worker=2)
+    executor = TaskExecutor(backend, dependency_manager)
+    task = make_task(
+        "import os\n"
+        "print(json.dumps({'pid': os.getpid()}))\n"
+    )
+    try:
+        pids = [(await executor.run(task, {}))["pid"] for _ in range(3)]
+    finally:
+        await executor.aclose()
+
+    assert pids[0] == pids[1] != pids[2]
+
+
+@pytest.mark.asyncio
+async def test_idle_reaper_survives_changes_and_failures():
+    from pathlib import Path
+    from types import SimpleNamespace
+    from enact.worker_pool import WorkerPool, _EnvWorkers
+
+    pool = WorkerPool(idle_timeout=0.1)
+    stopped = []
+
+    async def stop(name):
+        stopped.append(name)
+        # A run for a new venv, and a worker that fails to stop
+        pool._envs[Path(name)] = _EnvWorkers(1)
+        if name == "a":
+            raise OSError("stop failed")
+
+    for name in "ab":
+        env = pool._envs[Path("/" + name)] = _EnvWorkers(1)
+        env.idle.append(SimpleNamespace(
+            process=SimpleNamespace(pid=name), last_used=0.0,
+            stop=lambda name=name: stop(name)))
+    pool._ensure_reaper()
+    try:
+        for _ in range(50):
+            await asyncio.sleep(0.05)
+            if stopped == ["a", "b"]:
+                break
+        assert stopped == ["a", "b"]
+        assert not pool._reaper.done()
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_recovers_from_crashes(
+    dependency_manager, make_task
+):
+    executor = TaskExecutor("pool", dependency_manager)
+    crash = make_task("import os\nos._exit(3)")
+    task = make_task("print(json.dumps({'n': inputs['n'] * 2}))")
+    try:
+        with pytest.raises(RuntimeError, match="exited unexpectedly"):
+            await executor.run(crash, {})
+        with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+            await executor.run(make_task("1 / 0"), {})
+        assert await executor.run(task, {"n": 21}) == {"n": 42}
+    finally:
+        await executor.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork")
+async def test_forkserver_isolates_runs(dependency_manager, make_task):
+    backend = ForkServerBackend(dependency_manager, preload=["decimal"])
+    executor = TaskExecutor(backend, dependency_manager)
+    task = make_task(
+        "import os, sys\n"
+        "seen = hasattr(sys, 'enact_marker')\n"
+        "sys.enact_marker = True\n"
+        "print(json.dumps({'pid': os.getpid(), 'seen': seen,\n"
+        "                  'preloaded': 'decimal' in sys.modules}))\n"
+    )
+    try:
+        results = await asyncio.gather(
+            *(executor.run(task, {}) for _ in range(3)))
+        with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+            await executor.run(make_task("1 / 0"), {})
+    finally:
+        await executor.aclose()
+
+    assert len({r["pid"] for r in results}) == 3
+    assert not any(r["seen"] for r in results)
+    assert all(r["preloaded"] for r in results)
+
+
+@pytest.mark.asyncio
+async def test_subprocess_backend_passes_inputs_over_stdin(
+    dependency_manager, make_task
+):
+    task = make_task(
+        "print(json.dumps({'size': len(inputs['blob']), 'sum': sum(inputs['xs'])}))")
+    inputs = {"blob": b"\x00\xff" * 50_000, "xs": list(range(100_000))}
+
+    backend = SubprocessBackend(dependency_manager, input_encoding="pickle")
+    executor = TaskExecutor(backend, dependency_manager)
+
+    assert await executor.run(task, inputs) == {
+        "size": 100_000, "sum": sum(range(100_000))}
+
+
+@pytest.mark.asyncio
+async def test_profiled_run_returns_profile_beside_result(
+    tmp_path, task_definition
+):
+    from enact.profiling import TaskProfile
+
+    task = EnactTask.model_validate(dict(task_definition, tasks=[{
+        "id": "slow", "type": "script", "language": "python",
+        "code": (
+            "def busy():\n"
+            "    return sum(i * i for i in range(20000))\n"
+            "print(json.dumps({'total': busy()}))"
+        ),
+    }]))
+    executor = TaskExecutor(dependency_manager=DependencyManager(tmp_path))
+    profile = TaskProfile()
+
+    result = await executor.run(task, {}, profile=profile)
+
+    assert result == {"total": sum(i * i for i in range(20000))}
+    assert any(name == "busy" for _, _, name in profile.stats.stats)
+    collapsed = profile.to_collapsed()
+    assert ";busy (<task>:1);<built-in method builtins.sum>" in collapsed
+    saved = tmp_path / "task.prof"
+    profile.save(saved)
+    assert TaskProfile.load(saved).stats.total_calls == profile.stats.total_calls
+
+
+def test_collapsed_stacks_of_shared_callees_stay_bounded():
+    import marshal
+    from enact.profiling import TaskProfile
+
+    # main calls a0 and b0, and every a<i> and b<i> calls both a<i+1> and
+    # b<i+1>: 2 ** 40 distinct stacks, each function taking 1s itself
+    main = ("t.py", 1, "main")
+    layers = [[("t.py", 1, f"a{i}"), ("t.py", 1, f"b{i}")] for i in range(40)]
+    raw = {}
+    cumulative = 1.0
+    for depth in reversed(range(len(layers))):
+        callers = layers[depth - 1] if depth else [main]
+        for function in layers[depth]:
+            raw[function] = (1, 1, 1.0, cumulative, {
+                caller: (1, 1, 0.0, cumulative / len(callers))
+                for caller in callers})
+        cumulative += 1.0
+    raw[main] = (1, 1, 1.0, cumulative, {})
+    profile = TaskProfile(marshal.dumps(raw))
+
+    lines = profile.to_collapsed(scale=1000).splitlines()
+
+    assert "main (t.py:1) 1000" in lines
+    assert "main (t.py:1);a0 (t.py:1);b1 (t.py:1) 500" in lines
+    assert len(lines) < 100_000
+    assert not profile.to_collapsed(max_depth=3).count(";a3 ")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "backend", ["subprocess", "pool", "forkserver", "inprocess"])
+async def test_result_channel_and_artifacts(
+    dependency_manager, tmp_path, backend, make_task
+):
+    from enact.backends import create_backend
+    from enact.outputs import Artifact
+
+    if backend == "forkserver" and not hasattr(os, "fork"):
+        pytest.skip("requires os.fork")
+    executor = TaskExecutor(
+        create_backend(backend, dependency_manager, artifacts_root=tmp_path),
+        dependency_manager)
+    task = make_task(
+        "print('log noise')\n"
+        "image = save_artifact('plot.png', bytes(range(256)), 'image/png')\n"
+        "set_result({'image': image, 'n': inputs['n']})\n"
+    )
+    try:
+        result = await executor.run(task, {"n": 1})
+    finally:
+        await executor.aclose()
+
+    assert result["n"] == 1
+    image = result["image"]
+    assert isinstance(image, Artifact)
+    assert (image.name, image.size, image.content_type) == (
+        "plot.png", 256, "image/png")
+    assert image.read_bytes() == bytes(range(256))
+    image.delete()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_marshal_results_carry_bytes(dependency_manager, make_task):
+    backend = SubprocessBackend(dependency_manager, result_encoding="marshal")
+    executor = TaskExecutor(backend, dependency_manager)
+    task = make_task("set_result({'raw': b'\\x00\\xff' * 4})")
+
+    assert await executor.run(task, {}) == {"raw": b"\x00\xff" * 4}
+
+
+@pytest.mark.asyncio
+async def test_stream_yields_records_while_the_task_runs(
+    dependency_manager, make_task
+):
+    task = make_task(
+        "import sys, time\n"
+        "for i in range(inputs['n']):\n"
+        "    emit({'i': i})\n"
+        "    time.sleep(0.05)\n"
+        "sys.stderr.write('x' * 100_000)\n"
+        "raise SystemExit('done badly')\n"
+    )
+    executor = TaskExecutor(dependency_manager=dependency_manager)
+    stream = executor.stream(task, {"n": 40}, stderr_spill_bytes=1024)
+
+    started = time.monotonic()
+    first = await stream.__anext__()
+    # The first record arrives long before the task finishes
+    assert first == {"i": 0}
+    assert time.monotonic() - started < 1.5
+
+    records = [first]
+    with pytest.raises(RuntimeError, match="done badly"):
+        async for record in stream:
+            records.append(record)
+    assert records == [{"i": i} for i in range(40)]
+
+
+@pytest.mark.asyncio
+async def test_closing_a_stream_stops_the_task(dependency_manager, make_task):
+    task = make_task(
+        "import os, time\n"
+        "emit(os.getpid())\n"
+        "while True:\n"
+        "    emit('working')\n"
+        "    time.sleep(0.02)\n"
+    )
+    executor = TaskExecutor(dependency_manager=dependency_manager)
+    records = executor.stream(task, {})
+    try:
+        pid = await records.__anext__()
+    finally:
+        await records.aclose()
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        await asyncio.sleep(0.05)
+    else:
+        pytest.fail("the task kept running after the stream was closed")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["subprocess", "pool", "forkserver"])
+async def test_timeout_kills_the_task(dependency_manager, backend, make_task):
+    from enact.limits import TaskTimeout
+    from enact.models import ResourceLimits
+
+    if backend == "forkserver" and not hasattr(os, "fork"):
+        pytest.skip("requires os.fork")
+    executor = TaskExecutor(
+        backend, dependency_manager, limits=ResourceLimits(timeout=0.5))
+    try:
+        started = time.monotonic()
+        with pytest.raises(TaskTimeout):
+            await executor.run(make_task("import time\ntime.sleep(30)"), {})
+        assert time.monotonic() - started < 5
+        # The backend is still usable afterwards
+        task = make_task("print(json.dumps({'ok': True}))")
+        assert await executor.run(task, {}) == {"ok": True}
+    finally:
+        await executor.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="requires process groups")
+@pytest.mark.parametrize("backend", ["subprocess", "forkserver"])
+async def test_timeout_kills_the_whole_process_tree(
+    dependency_manager, tmp_path, backend, make_task
+):
+    from enact.limits import TaskTimeout
+    from enact.models import ResourceLimits
+
+    marker = tmp_path / "orphan"
+    orphan = f"import time; time.sleep(1.5); open({str(marker)!r}, 'w')"
+    task = make_task(
+        "import subprocess, sys, time\n"
+        f"subprocess.Popen([sys.executable, '-c', {orphan!r}])\n"
+        "time.sleep(30)\n"
+    )
+    executor = TaskExecutor(backend, dependency_manager)
+    try:
+        with pytest.raises(TaskTimeout):
+            await executor.run(task, {}, limits=ResourceLimits(timeout=0.5))
+    finally:
+        await executor.aclose()
+    await asyncio.sleep(2)
+
+    assert not marker.exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="requires rlimits")
+@pytest.mark.parametrize("backend", ["subprocess", "forkserver"])
+async def test_cpu_and_memory_limits(dependency_manager, backend, make_task):
+    from enact.limits import ResourceLimitExceeded
+    from enact.models import ResourceLimits
+
+    executor = TaskExecutor(backend, dependency_manager)
+    try:
+        with pytest.raises(ResourceLimitExceeded, match="CPU time"):
+            await executor.run(
+                make_task("while True:\n    pass"), {},
+                limits=ResourceLimits(cpu_seconds=1))
+        with pytest.raises(RuntimeError, match="MemoryError"):
+            await executor.run(
+                make_task("blob = bytearray(1024 ** 3)"), {},
+                limits=ResourceLimits(memory_bytes=512 * 1024 ** 2))
+    finally:
+        await executor.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "backend", ["subprocess", "pool", "forkserver", "inprocess"])
+async def test_output_limit(dependency_manager, backend, make_task):
+    from enact.limits import OutputLimitExceeded
+    from enact.models import ResourceLimits
+
+    if backend == "forkserver" and not hasattr(os, "fork"):
+        pytest.skip("requires os.fork")
+    executor = TaskExecutor(backend, dependency_manager)
+    limits = ResourceLimits(max_output_bytes=10_000)
+    try:
+        with pytest.raises(OutputLimitExceeded):
+            await executor.run(
+                make_task("print('x' * 100_000)"), {}, limits=limits)
+        # Counted in bytes, not characters
+        with pytest.raises(OutputLimitExceeded):
+            await executor.run(
+                make_task("print('\u00e9' * 6_000)"), {}, limits=limits)
+        # Stopped while it prints, however it handles errors
+        runaway = "while True:\n    try:\n        print('x' * 1000)\n" \
+            "    except Exception:\n        pass"
+        with pytest.raises(OutputLimitExceeded):
+            await executor.run(make_task(runaway), {}, limits=limits)
+        task = make_task("print(json.dumps({'ok': True}))")
+        assert await executor.run(task, {}, limits=limits) == {"ok": True}
+    finally:
+        await executor.aclose()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(os.name != "posix", reason="requires rlimits")
+async def test_runner_applies_rlimits_without_preexec_fn(
+    dependency_manager, monkeypatch, make_task
+):
+    import enact.dependency_manager as dm
+    from enact.models import ResourceLimits
+
+    spawned = []
+
+    def recording_spawn_options(*args, **kwargs):
+        options = spawn_options(*args, **kwargs)
+        spawned.append(options)
+        return options
+
+    spawn_options = dm.spawn_options
+    monkeypatch.setattr(dm, "spawn_options", recording_spawn_options)
+    executor = TaskExecutor(dependency_manager=dependency_manager)
+    task = make_task(
+        "import resource\n"
+        "print(json.dumps(resource.getrlimit(resource.RLIMIT_CPU)[0]))")
+    limits = ResourceLimits(cpu_seconds=7)
+
+    assert await executor.run(task, {}, limits=limits) == 7
+    assert [7] == [r async for r in executor.stream(task, {}, limits=limits)]
+    assert spawned and not any("preexec_fn" in o for o in spawned)
+
+
+def test_limits_combine_executor_task_and_call(dependency_manager, make_task):
+    from enact.models import ResourceLimits
+
+    executor = TaskExecutor(
+        dependency_manager=dependency_manager,
+        limits=ResourceLimits(timeout=60, cpu_seconds=10))
+    task = make_task("pass")
+    task.limits = ResourceLimits(timeout=300, memory_bytes=2 ** 30)
+
+    # A task can only tighten the executor's defaults
+    assert executor._limits(task, None) == ResourceLimits(
+        timeout=60, cpu_seconds=10, memory_bytes=2 ** 30)
+    # Limits passed to a call win
+    assert executor._limits(task, ResourceLimits(timeout=120)) == ResourceLimits(
+        timeout=120, cpu_seconds=10, memory_bytes=2 ** 30)
+
+
+def test_execute_locally_times_out(executor, make_task):
+    from enact.limits import TaskTimeout
+    from enact.models import ResourceLimits
+
+    task = make_task("import time\ntime.sleep(30)")
+    started = time.monotonic()
+    with pytest.raises(TaskTimeout):
+        executor.execute_locally(
+            task, executor.create_script(task, {}), ResourceLimits(timeout=0.5))
+    assert time.monotonic() - started < 5
+
+
+@pytest.mark.asyncio
+async def test_inprocess_backend_needs_no_venv(
+    tmp_path, make_task, task_definition
+):
+    dependency_manager = DependencyManager(tmp_path / "venvs")
+    stdout = sys.stdout
+    executor = TaskExecutor("inprocess", dependency_manager)
+    task = make_task(
+        "import time\n"
+        "print('working on', inputs['n'])\n"
+        "time.sleep(0.1)\n"
+        "set_result({'n': inputs['n'], 'keys': sorted(inputs)})\n"
+    )
+    try:
+        results = await asyncio.gather(
+            *(executor.run(task, {"n": n}) for n in range(8)))
+        with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+            await executor.run(make_task("1 / 0"), {})
+        with pytest.raises(RuntimeError, match="can't run in-process"):
+            await executor.run(EnactTask.model_validate(dict(
+                task_definition, dependencies={"python": {"packages": [
+                    {"name": "six", "version": "1.16.0"}]}})), {})
+    finally:
+        await executor.aclose()
+
+    assert results == [{"n": n, "keys": ["n"]} for n in range(8)]
+    assert dependency_manager.list_venvs() == []
+    # The stdout proxy is only installed while the backend is open
+    assert sys.stdout is stdout
+
+
+@pytest.mark.asyncio
+async def test_syntax_errors_surface_before_any_venv_is_built(
+    tmp_path, make_task
+):
+    dependency_manager = DependencyManager(tmp_path / "venvs")
+    executor = TaskExecutor(dependency_manager=dependency_manager)
+    task = make_task("print(json.dumps({'ok': True})")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="does not compile"):
+            await executor.run(task, {})
+    assert dependency_manager.list_venvs() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["subprocess", "pool", "forkserver"])
+async def test_runs_load_compiled_code_from_the_cache(
+    dependency_manager, backend, make_task
+):
+    import marshal
+    from importlib.util import MAGIC_NUMBER
+
+    if backend == "forkserver" and not hasattr(os, "fork"):
+        pytest.skip("requires os.fork")
+    code = f"print(json.dumps({{'compiled': False, 'backend': {backend!r}}}))"
+    path = dependency_manager.code_cache.path_for(code)
+    assert path.parent.name == sys.implementation.cache_tag
+    # Swap in different bytecode to tell loading apart from compiling
+    swapped = compile("print(json.dumps({'compiled': True}))", "<task>", "exec")
+    path.write_bytes(MAGIC_NUMBER + marshal.dumps(swapped))
+
+    executor = TaskExecutor(backend, dependency_manager)
+    try:
+        assert await executor.run(make_task(code), {}) == {"compiled": True}
+    finally:
+        await executor.aclose()
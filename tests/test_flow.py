@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from enact.backends import ExecutionBackend
+from enact.dependency_manager import DependencyManager
+from enact.executor import TaskExecutor
+from enact.flow import build_graph
+from enact.models import EnactTask
+
+
+class EvalBackend(ExecutionBackend):
+    """Evaluates step code as an expression after a short delay
+
+    Records the most steps that were running at once.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+        self.running = 0
+        self.max_running = 0
+
+    async def run(self, venv_path, code, inputs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.2)
+        finally:
+            self.running -= 1
+        return json.dumps(eval(code, {"inputs": inputs}))
+
+
+def composite(definition, tasks, steps):
+    definition = dict(definition, type="composite")
+    definition["tasks"] = [
+        {"id": id, "type": "script", "language": "python", "code": code}
+        for id, code in tasks.items()
+    ]
+    definition["flow"] = {"steps": steps}
+    return EnactTask.model_validate(definition)
+
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_in_parallel(tmp_path, task_definition):
+    task = composite(
+        task_definition,
+        {
+            "double": "{'double': inputs['n'] * 2}",
+            "square": "{'square': inputs['n'] ** 2}",
+            "total": "{'total': inputs['steps']['double']['double']"
+                     " + inputs['steps']['square']['square']}",
+        },
+        [
+            {"task": "double", "depends_on": []},
+            {"task": "square", "depends_on": []},
+            {"task": "total", "depends_on": ["double", "square"]},
+        ],
+    )
+    backend = EvalBackend()
+    executor = TaskExecutor(
+        backend, dependency_manager=DependencyManager(tmp_path / "venvs"))
+    venv_path = tmp_path / "venv"
+    venv_path.mkdir()
+
+    result = await executor.run(task, {"n": 3}, venv_path)
+
+    assert result == {"total": 15}
+    assert backend.max_running == 2
+
+
+def test_steps_default_to_sequential_and_cycles_are_rejected(task_definition):
+    task = composite(
+        task_definition, {"a": "{}", "b": "{}"}, [{"task": "a"}, {"task": "b"}])
+    assert build_graph(task)["b"].depends_on == ["a"]
+
+    cyclic = composite(task_definition, {"a": "{}", "b": "{}"}, [
+        {"task": "a", "depends_on": ["b"]},
+        {"task": "b", "depends_on": ["a"]},
+    ])
+    with pytest.raises(ValueError, match="cycle"):
+        build_graph(cyclic)
+
+
+@pytest.mark.asyncio
+async def test_final_steps_must_return_objects(tmp_path, task_definition):
+    task = composite(
+        task_definition, {"a": "{'a': 1}", "b": "[1, 2]"},
+        [{"task": "a", "depends_on": []}, {"task": "b", "depends_on": []}])
+    executor = TaskExecutor(
+        EvalBackend(), dependency_manager=DependencyManager(tmp_path / "venvs"))
+    venv_path = tmp_path / "venv"
+    venv_path.mkdir()
+
+    with pytest.raises(RuntimeError, match="Flow step b returned list"):
+        await executor.run(task, {}, venv_path)
+
+
+@pytest.mark.asyncio
+async def test_flows_returning_artifacts_are_not_memoized(
+    tmp_path, task_definition
+):
+    from enact.cache import ResultCache
+    from enact.outputs import TaskOutput
+
+    class ArtifactBackend(ExecutionBackend):
+        calls = 0
+
+        async def run(self, venv_path, code, inputs):
+            self.calls += 1
+            run_dir = self.new_artifacts_dir()
+            run_dir.mkdir(parents=True)
+            (run_dir / "out.txt").write_text(code)
+            handle = {"$artifact": {
+                "name": "out.txt", "path": str(run_dir / "out.txt"),
+                "size": len(code), "content_type": None}}
+            return TaskOutput(
+                json.dumps({"file": handle}), artifacts_dir=run_dir)
+
+    dependency_manager = DependencyManager(tmp_path / "venvs")
+    backend = ArtifactBackend(dependency_manager, tmp_path / "artifacts")
+    executor = TaskExecutor(
+        backend, dependency_manager,
+        result_cache=ResultCache(cache_dir=tmp_path / "results"))
+    task = composite(task_definition, {"save": "'saved'"}, [{"task": "save"}])
+    task.cacheable = True
+    venv_path = tmp_path / "venv"
+    venv_path.mkdir()
+
+    for _ in range(2):
+        result = await executor.run(task, {}, venv_path)
+        assert result["file"].read_text() == "'saved'"
+        result["file"].delete()
+
+    assert backend.calls == 2
@@ -0,0 +1,43 @@
+import pytest
+from enact import EnactClient
+from enact.metrics import Histogram, HistogramCollector, Timings
+
+
+
+def test_histogram_percentiles_are_close():
+    histogram = Histogram()
+    for ms in range(1, 1001):
+        histogram.observe(ms / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.percentile(1.0) == 1.0
+
+
+@pytest.mark.asyncio
+async def test_execute_task_reports_every_phase(tmp_path, registry_transport):
+    from enact.dependency_manager import DependencyManager
+
+    collector = HistogramCollector()
+    timings = Timings()
+    async with EnactClient(
+        "http://localhost:8000",
+        transport=registry_transport([]),
+        dependency_manager=DependencyManager(tmp_path),
+        instrumentation=collector,
+    ) as client:
+        result = await client.execute_task(
+            "HelloWorld", {"name": "World"}, timings=timings)
+        await client.execute_task("HelloWorld", {"name": "again"})
+
+    assert result == {"greeting": "Hello, World"}
+    assert set(timings.seconds) == {
+        "fetch", "validate", "venv", "encode", "startup", "run", "parse"}
+    assert timings.bytes["fetch"] > 0 and timings.bytes["parse"] > 0
+    # The second call hit the task cache but still ran
+    stats = collector.as_dict()
+    assert stats["fetch"]["count"] == 1
+    assert stats["run"]["count"] == 2
+    assert 'enact_phase_seconds{phase="startup",quantile="0.99"}' in (
+        collector.export_prometheus())